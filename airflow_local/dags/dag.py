@@ -26,12 +26,15 @@ def load_data_to_db():
     def scrap_data_from_fapl() -> list[dict]:
         # TODO fix pythonpath issues
         from parser import get_posts
+        from fetcher import Fetcher
         from utils import load_yaml_from_file
 
         config = load_yaml_from_file('interface/config.yml')
         logger.info("Loaded config")
 
-        result: list[dict] = get_posts(n_months_to_iterate=config['data']['n_months'])
+        with Fetcher.from_config(config['scraper']) as fetcher:
+            result: list[dict] = get_posts(n_months_to_iterate=config['data']['n_months'], fetcher=fetcher,
+                                           backend=config['scraper']['parser_backend'])
 
         return result
 
@@ -45,7 +48,7 @@ def load_data_to_db():
         from loader import load_data
         from models import Base
         from database import engine
-        from opensearchpy import OpenSearch
+        from search_client import create_os_client
 
         config = load_yaml_from_file('interface/config.yml')
         logger.info("Loaded config")
@@ -54,7 +57,7 @@ def load_data_to_db():
         embedder = Embedder(settings)
         logger.info("Initialized embedding model '%s'", settings.model_name)
 
-        os_client = OpenSearch(([{"host": config["os_params"]["host"], "port": config["os_params"]["port"]}]))
+        os_client = create_os_client(config["os_params"])
         logger.info("Initialized opensearch-py client")
 
         Base.metadata.create_all(bind=engine)
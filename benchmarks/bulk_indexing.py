@@ -0,0 +1,90 @@
+"""
+OpenSearch indexing throughput of the loader's update_search: sequential bulk requests vs parallel streaming
+bulk, over a lazily generated stream of posts.
+
+Without --os-host the posts go to the in-memory stand-in, whose bulk requests take --bulk-ms and reject
+--rejection-rate of the documents with 429. With --os-host they go to a real cluster, into a scratch index
+that is deleted afterwards, and the parallel run also uses the fast indexing mode (no refreshes and replicas
+during the load, force-merge at the end).
+
+    python -m benchmarks.bulk_indexing --n-posts 20000 --threads 1 4 8 --bulk-ms 40 --rejection-rate 0.01
+    python -m benchmarks.bulk_indexing --os-host localhost --n-posts 200000 --threads 1 4
+"""
+import argparse
+import random
+import sys
+import time
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterator
+
+from interface.schemas import Post
+
+ROOT = Path(__file__).resolve().parent.parent
+# utils modules import each other the way the Airflow workers see them
+sys.path[:0] = [str(ROOT / 'utils'), str(ROOT / 'interface')]
+
+from elastic_loader import create_index, fast_indexing, update_search  # noqa: E402
+from search_client import create_os_client  # noqa: E402
+
+from benchmarks.embedder_encode import WORDS  # noqa: E402
+from benchmarks.standins import InMemoryOpenSearch  # noqa: E402
+
+TAGS = ("АПЛ", "Арсенал", "Челси", "трансферы", "травмы")
+
+
+def generate_posts(n_posts: int, seed: int = 0) -> Iterator[Post]:
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    for i in range(n_posts):
+        yield Post(uid=100000 + i, title=' '.join(rng.choices(WORDS, k=6)),
+                   text_content=' '.join(rng.choices(WORDS, k=rng.choice((32, 128, 400)))),
+                   tags=rng.sample(TAGS, k=2), n_visits=rng.randint(0, 5000), author='fapl',
+                   dt=start + timedelta(hours=i))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--n-posts', type=int, default=20000)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--chunk-size', type=int, default=500)
+    parser.add_argument('--max-chunk-bytes', type=int, default=10 * 1024 * 1024)
+    parser.add_argument('--initial-backoff', type=float, default=0.5)
+    parser.add_argument('--bulk-ms', type=float, default=40.0, help='stand-in round trip per bulk request')
+    parser.add_argument('--rejection-rate', type=float, default=0.01, help='stand-in share of 429 rejections')
+    parser.add_argument('--os-host', default=None)
+    parser.add_argument('--os-port', type=int, default=9200)
+    parser.add_argument('--index-name', default='bulk-indexing-benchmark')
+    args = parser.parse_args()
+
+    print(f"{args.n_posts} posts, chunks of {args.chunk_size} docs / {args.max_chunk_bytes} bytes")
+    for thread_count in args.threads:
+        if args.os_host is None:
+            os_client = InMemoryOpenSearch(bulk_ms=args.bulk_ms, rejection_rate=args.rejection_rate)
+        else:
+            os_client = create_os_client({"host": args.os_host, "port": args.os_port})
+            if os_client.indices.exists(index=args.index_name):
+                os_client.indices.delete(index=args.index_name)
+            create_index(args.index_name, os_client)
+
+        fast_mode = args.os_host is not None and thread_count > 1
+        start = time.perf_counter()
+        with fast_indexing(args.index_name, os_client, max_num_segments=5) if fast_mode else nullcontext():
+            indexed = update_search(generate_posts(args.n_posts), os_client, index_name=args.index_name,
+                                    batch_size=args.chunk_size, thread_count=thread_count,
+                                    max_chunk_bytes=args.max_chunk_bytes, initial_backoff=args.initial_backoff)
+        elapsed = time.perf_counter() - start
+
+        details = ""
+        if args.os_host is None:
+            details = f"  bulk requests {os_client.n_bulk_requests:5}  rejections {os_client.n_rejected:5}"
+            assert len(os_client.documents) == args.n_posts, "some posts were not indexed"
+        else:
+            os_client.indices.delete(index=args.index_name)
+        print(f"{thread_count:2} threads{' + fast mode' if fast_mode else '':12} {indexed:8} docs in "
+              f"{elapsed:6.2f}s  {indexed / elapsed:9.0f} docs/sec{details}")
+
+
+if __name__ == '__main__':
+    main()
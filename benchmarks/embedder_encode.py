@@ -0,0 +1,105 @@
+"""
+Throughput of Embedder.encode against the previous per-row torch.cat implementation on CPU.
+
+    python -m benchmarks.embedder_encode --n-sentences 512
+"""
+import argparse
+import random
+import time
+
+import more_itertools
+import numpy as np
+import torch
+import torch.nn.functional as F
+from transformers import AutoTokenizer, XLMRobertaTokenizer
+
+from interface.embedder import Embedder
+from interface.schemas import EmbedderSettings
+from interface.utils import load_yaml_from_file
+
+
+WORDS = ("Арсенал", "забил", "гол", "в", "ворота", "Челси", "на", "последних", "минутах", "матча",
+         "тренер", "заявил", "после", "игры", "что", "команда", "провела", "отличный", "сезон")
+
+
+def make_corpus(n_sentences: int, seed: int = 0) -> list[str]:
+    """Sentences of very different lengths, like a mix of short notes and long match reports."""
+    rng = random.Random(seed)
+    return [' '.join(rng.choices(WORDS, k=rng.choice((8, 32, 128, 400)))) for _ in range(n_sentences)]
+
+
+def legacy_encode(embedder: Embedder, tokenizer, sentences: list[str], doc_type: str) -> np.ndarray:
+    """The encode loop as it was before bucketing: pad to the longest, grow the result row by row."""
+    sentences = embedder.preprocess_sentences(sentences, doc_type)
+    embeddings = torch.tensor([]).to(embedder.device)
+
+    for batch in more_itertools.chunked(sentences, embedder.batch_size):
+        tokenized_batch = tokenizer(batch, max_length=512, padding=True,
+                                    truncation=True, return_tensors='pt').to(embedder.device)
+
+        with torch.no_grad():
+            outputs = embedder.model(**tokenized_batch).last_hidden_state
+            embed = embedder.average_pool(outputs, tokenized_batch['attention_mask'])
+
+        torch.cuda.empty_cache()
+
+        for tensor in embed:
+            embeddings = torch.cat((embeddings, tensor.unsqueeze(0)), 0)
+
+    return np.array([torch.Tensor.cpu(emb) for emb in F.normalize(embeddings, dim=-1)])
+
+
+def measure(fn, sentences: list[str], repeats: int) -> float:
+    fn(sentences[:2])  # warm-up
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(sentences)
+        best = min(best, time.perf_counter() - start)
+    return len(sentences) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', default='interface/config.yml')
+    parser.add_argument('--model-name', default=None, help='overrides embedding_model.model_name')
+    parser.add_argument('--n-sentences', type=int, default=256)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--threads', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    config = load_yaml_from_file(args.config)
+    if args.model_name:
+        config['embedding_model']['model_name'] = args.model_name
+    settings = EmbedderSettings(**config['embedding_model'])
+
+    embedder = Embedder(settings)
+    embedder.device = torch.device('cpu')
+    embedder.model.to(embedder.device)
+
+    if settings.model_type == 'e5':
+        legacy_tokenizer = XLMRobertaTokenizer.from_pretrained(settings.model_name)
+    else:
+        legacy_tokenizer = AutoTokenizer.from_pretrained(settings.model_name)
+
+    sentences = make_corpus(args.n_sentences)
+
+    new = embedder.encode(sentences, doc_type='document')
+    old = legacy_encode(embedder, legacy_tokenizer, sentences, doc_type='document')
+    max_abs_diff = float(np.abs(new - old).max())
+
+    legacy_rate = measure(lambda s: legacy_encode(embedder, legacy_tokenizer, s, 'document'), sentences, args.repeats)
+    bucketed_rate = measure(lambda s: embedder.encode(s, 'document'), sentences, args.repeats)
+
+    print(f"model: {settings.model_name}, sentences: {len(sentences)}, batch_size: {settings.batch_size}, "
+          f"threads: {torch.get_num_threads()}")
+    print(f"legacy:   {legacy_rate:8.1f} sentences/sec")
+    print(f"bucketed: {bucketed_rate:8.1f} sentences/sec ({bucketed_rate / legacy_rate:.2f}x)")
+    print(f"max abs difference between outputs: {max_abs_diff:.2e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Document encoding throughput of the ingestion path: in-process vs EmbeddingPool at several worker counts.
+Only encoding is measured, nothing is written to the database.
+
+    python -m benchmarks.embedding_pool --n-posts 1024 --workers 1 2 4 8
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+# utils modules import each other the way the Airflow workers see them
+sys.path[:0] = [str(ROOT / 'utils'), str(ROOT / 'interface')]
+
+import torch  # noqa: E402
+
+from chunker import TokenChunker  # noqa: E402
+from embedder import Embedder  # noqa: E402
+from embedding_pool import EmbeddingPool  # noqa: E402
+from loader import encode_batches  # noqa: E402
+from schemas import EmbedderSettings, Post  # noqa: E402
+
+from benchmarks.embedder_encode import make_corpus  # noqa: E402
+from interface.utils import load_yaml_from_file  # noqa: E402
+
+
+def make_posts(n_posts: int) -> list[Post]:
+    return [Post(uid=uid, title=f'post {uid}', text_content=text, tags=[], n_visits=0, author='',
+                 dt=datetime(2025, 1, 1))
+            for uid, text in enumerate(make_corpus(n_posts, seed=3))]
+
+
+def drain(batches) -> int:
+    return sum(len(batch) for batch, _, _ in batches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', default='interface/config.yml')
+    parser.add_argument('--model-name', default=None, help='overrides embedding_model.model_name')
+    parser.add_argument('--n-posts', type=int, default=512)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--shard-size', type=int, default=None, help='overrides data.embedding_shard_size')
+    args = parser.parse_args()
+
+    config = load_yaml_from_file(args.config)
+    if args.model_name:
+        config['embedding_model']['model_name'] = args.model_name
+    if args.shard_size:
+        config['data']['embedding_shard_size'] = args.shard_size
+    posts = make_posts(args.n_posts)
+
+    embedder = Embedder(EmbedderSettings(**config['embedding_model']))
+    chunker = None
+    if config['chunking']['enabled']:
+        chunker = TokenChunker(embedder.tokenizer, config['chunking']['chunk_size'], config['chunking']['overlap'])
+
+    print(f"{len(posts)} posts, {os.cpu_count()} cores, shard size {config['data']['embedding_shard_size']}")
+    start = time.perf_counter()
+    drain(encode_batches(posts, embedder, config['data']['ingest_chunk_size'], chunker))
+    baseline = len(posts) / (time.perf_counter() - start)
+    print(f"in-process ({torch.get_num_threads():2} threads):  {baseline:8.1f} posts/sec")
+
+    for workers in args.workers:
+        config['data']['embedding_workers'] = workers
+        with EmbeddingPool.from_config(config) as pool:
+            # one shard per worker: spawn the workers and load the models outside the timing
+            drain(pool.map_shards(posts[:workers * pool.shard_size]))
+            start = time.perf_counter()
+            drain(pool.map_shards(posts))
+            rate = len(posts) / (time.perf_counter() - start)
+        print(f"{workers} workers x {pool.threads_per_worker:2} threads: {rate:8.1f} posts/sec "
+              f"({rate / baseline:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+A local HTTP server speaking GigaChat's streaming chat API (POST .../chat/completions with stream=true),
+with configurable latency, a slow tail and injected 503s. Point the real client at it with
+GigaChat(base_url=server.base_url, access_token="fake", model="GigaChat").
+
+    python -m benchmarks.fake_gigachat_server --port 8090 --slow-rate 0.05 --error-rate 0.02
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeGigaChatServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, answer: str = "Ответ из локального сервера.", first_token_ms: float = 50.0,
+                 token_ms: float = 5.0, slow_rate: float = 0.0, slow_first_token_ms: float = 3000.0,
+                 error_rate: float = 0.0, seed: int = 0):
+        super().__init__(("127.0.0.1", port), ChatHandler)
+        self.tokens = re.findall(r'\S+\s*', answer)
+        self.first_token = first_token_ms / 1000
+        self.token_delay = token_ms / 1000
+        self.slow_rate = slow_rate
+        self.slow_first_token = slow_first_token_ms / 1000
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.n_requests = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/api/v1"
+
+    def draw(self) -> tuple[bool, bool]:
+        with self.lock:
+            self.n_requests += 1
+            return self.rng.random() < self.error_rate, self.rng.random() < self.slow_rate
+
+    def start(self) -> "FakeGigaChatServer":
+        threading.Thread(target=self.serve_forever, name="fake-gigachat", daemon=True).start()
+        return self
+
+
+class ChatHandler(BaseHTTPRequestHandler):
+    server: FakeGigaChatServer
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.endswith("/chat/completions") or not payload.get("stream"):
+            self.send_error(404)
+            return
+
+        fail, slow = self.server.draw()
+        if fail:
+            self.send_response(503)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(b'{"status": 503, "message": "Service Unavailable"}')
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        time.sleep(self.server.slow_first_token if slow else self.server.first_token)
+        prompt_tokens = sum(len(message.get("content", "").split()) for message in payload.get("messages", []))
+        try:
+            for i, token in enumerate(self.server.tokens):
+                if i:
+                    time.sleep(self.server.token_delay)
+                self.send_event({"delta": {"content": token, "role": "assistant"}, "index": 0})
+            self.send_event({"delta": {"content": "", "role": "assistant"}, "index": 0, "finish_reason": "stop"},
+                            usage={"prompt_tokens": prompt_tokens, "completion_tokens": len(self.server.tokens),
+                                   "total_tokens": prompt_tokens + len(self.server.tokens)})
+            self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client gave up on this stream, e.g. it lost a hedge
+
+    def send_event(self, choice: dict, usage: dict | None = None) -> None:
+        chunk = {"choices": [choice], "created": int(time.time()), "model": "GigaChat", "object": "chat.completion"}
+        if usage is not None:
+            chunk["usage"] = usage
+        self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode())
+        self.wfile.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--first-token-ms', type=float, default=50.0)
+    parser.add_argument('--token-ms', type=float, default=5.0)
+    parser.add_argument('--slow-rate', type=float, default=0.0)
+    parser.add_argument('--slow-first-token-ms', type=float, default=3000.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FakeGigaChatServer(args.port, first_token_ms=args.first_token_ms, token_ms=args.token_ms,
+                                slow_rate=args.slow_rate, slow_first_token_ms=args.slow_first_token_ms,
+                                error_rate=args.error_rate)
+    print(f"Serving a fake GigaChat API at {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
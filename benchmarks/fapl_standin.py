@@ -0,0 +1,96 @@
+"""
+Local stand-in for fapl.ru serving the pages in benchmarks/fixtures/fapl, so the scraper can run without
+network access. The fixtures are synthetic pages in the site's layout and cp1251 encoding, not captures.
+
+Every /calendar/<year>/<month>/ URL returns calendar.html. /posts/<uid>/ returns post_<uid>.html when
+it exists, otherwise one of the fixture post pages picked by uid.
+
+    python -m benchmarks.fapl_standin --port 8081 --latency-ms 50
+"""
+import argparse
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+
+FIXTURES_DIR = Path(__file__).parent / 'fixtures' / 'fapl'
+
+
+def load_pages(fixtures_dir: Path = FIXTURES_DIR) -> tuple[bytes, dict[int, bytes]]:
+    calendar = (fixtures_dir / 'calendar.html').read_bytes()
+    posts = {int(re.findall(r'\d+', path.stem)[0]): path.read_bytes()
+             for path in sorted(fixtures_dir.glob('post_*.html'))}
+    return calendar, posts
+
+
+class FaplStandIn(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], latency: float = 0.0, fixtures_dir: Path = FIXTURES_DIR):
+        self.latency = latency
+        self.calendar, self.posts = load_pages(fixtures_dir)
+        self.n_requests = 0
+        self._lock = threading.Lock()
+        super().__init__(address, StandInHandler)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def page(self, path: str) -> bytes | None:
+        if path.startswith('/calendar/'):
+            return self.calendar
+        match = re.fullmatch(r'/posts/(\d+)/?', path)
+        if match:
+            uid = int(match.group(1))
+            uids = sorted(self.posts)
+            return self.posts.get(uid, self.posts[uids[uid % len(uids)]])
+        return None
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    server: FaplStandIn
+
+    def do_GET(self):
+        with self.server._lock:
+            self.server.n_requests += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        body = self.server.page(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=windows-1251')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FaplStandIn((args.host, args.port), latency=args.latency_ms / 1000)
+    print(f'Serving synthetic fapl.ru pages at {server.base_url}')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
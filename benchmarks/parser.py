@@ -0,0 +1,85 @@
+"""
+Per-page parse cost of every parser backend over the fixture pages in benchmarks/fixtures/fapl, with an
+equivalence check against the reference html.parser backend. Exits with status 1 if any backend disagrees.
+
+The fixtures are synthetic, not captures of fapl.ru: generated cp1251 pages in the site's layout with
+filler menus and bodies. Both the timings and the equivalence check only hold for that markup; drop real
+pages into the fixtures directory before drawing conclusions about the site.
+
+    python -m benchmarks.parser --repeats 50
+"""
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+# utils modules import each other the way the Airflow workers see them
+sys.path[:0] = [str(ROOT / 'utils'), str(ROOT / 'interface')]
+
+from parser import PARSER_BACKENDS, decode_html, parse_daily_posts_links, parse_post  # noqa: E402
+
+from benchmarks.fapl_standin import FIXTURES_DIR  # noqa: E402
+
+REFERENCE_BACKEND = 'html.parser'
+BASE_URL = 'http://fapl.ru'
+
+
+def load_fixtures() -> tuple[str, dict[int, str]]:
+    calendar = decode_html((FIXTURES_DIR / 'calendar.html').read_bytes())
+    posts = {int(re.findall(r'\d+', path.stem)[0]): decode_html(path.read_bytes())
+             for path in sorted(FIXTURES_DIR.glob('post_*.html'))}
+    return calendar, posts
+
+
+def check_equivalence(calendar: str, posts: dict[int, str]) -> list[str]:
+    mismatches = []
+    expected_links = parse_daily_posts_links(calendar, BASE_URL, REFERENCE_BACKEND)
+    expected_posts = {uid: parse_post(html, uid, REFERENCE_BACKEND) for uid, html in posts.items()}
+
+    for backend in PARSER_BACKENDS:
+        if parse_daily_posts_links(calendar, BASE_URL, backend) != expected_links:
+            mismatches.append(f'{backend}: calendar links differ')
+        for uid, html in posts.items():
+            if parse_post(html, uid, backend) != expected_posts[uid]:
+                mismatches.append(f'{backend}: post {uid} differs')
+    return mismatches
+
+
+def time_per_page(fn, pages: list, repeats: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for page in pages:
+            fn(*page)
+    return (time.perf_counter() - start) / (repeats * len(pages))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    calendar, posts = load_fixtures()
+
+    mismatches = check_equivalence(calendar, posts)
+    for mismatch in mismatches:
+        print(f'MISMATCH {mismatch}')
+    print(f'equivalence: {"FAILED" if mismatches else "ok"} '
+          f'({len(posts)} synthetic post pages, 1 synthetic calendar page, {len(PARSER_BACKENDS)} backends)')
+
+    post_pages = [(html, uid) for uid, html in posts.items()]
+    reference = None
+    for backend in PARSER_BACKENDS:
+        post_cost = time_per_page(lambda html, uid: parse_post(html, uid, backend), post_pages, args.repeats)
+        calendar_cost = time_per_page(lambda html: parse_daily_posts_links(html, BASE_URL, backend),
+                                      [(calendar,)], args.repeats)
+        reference = reference or post_cost
+        print(f'{backend:12} post: {post_cost * 1000:7.2f} ms/page ({reference / post_cost:5.1f}x)   '
+              f'calendar: {calendar_cost * 1000:7.2f} ms/page')
+
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
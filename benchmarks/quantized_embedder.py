@@ -0,0 +1,93 @@
+"""
+Parity and latency of the int8 QuantizedEmbedder against the fp32 Embedder on CPU.
+
+Parity is the cosine between both models' embeddings of the same texts; documents stay fp32-encoded
+in the database, so the query-vs-document scores are compared as well. Exits with status 1 when the
+lowest cosine is under --min-cosine.
+
+    python -m benchmarks.quantized_embedder --threads 4 --min-cosine 0.98
+"""
+import argparse
+import io
+import sys
+import time
+
+import numpy as np
+import torch
+
+from interface.embedder import Embedder, QuantizedEmbedder, configure_torch_threads
+from interface.schemas import EmbedderSettings
+from interface.utils import load_yaml_from_file
+
+from benchmarks.embedder_encode import make_corpus
+
+
+def model_megabytes(model: torch.nn.Module) -> float:
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / 2 ** 20
+
+
+def query_latencies(embedder: Embedder, queries: list[str]) -> np.ndarray:
+    embedder.encode(queries[:1], 'query')  # warm-up
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        embedder.encode([query], 'query')
+        latencies.append(time.perf_counter() - start)
+    return np.asarray(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', default='interface/config.yml')
+    parser.add_argument('--model-name', default=None, help='overrides embedding_model.model_name')
+    parser.add_argument('--n-queries', type=int, default=100)
+    parser.add_argument('--n-documents', type=int, default=64)
+    parser.add_argument('--threads', type=int, default=None, help='overrides embedding_model.num_threads')
+    parser.add_argument('--min-cosine', type=float, default=0.98)
+    args = parser.parse_args()
+
+    config = load_yaml_from_file(args.config)
+    if args.model_name:
+        config['embedding_model']['model_name'] = args.model_name
+    if args.threads:
+        config['embedding_model']['num_threads'] = args.threads
+    settings = EmbedderSettings(**config['embedding_model'])
+    configure_torch_threads(settings.num_threads, settings.num_interop_threads)
+
+    fp32 = Embedder(settings)
+    fp32.device = torch.device('cpu')
+    fp32.model.to(fp32.device)
+    int8 = QuantizedEmbedder(settings)
+
+    queries = [' '.join(sentence.split()[:12]) for sentence in make_corpus(args.n_queries, seed=1)]
+    documents = make_corpus(args.n_documents, seed=2)
+
+    fp32_queries, int8_queries = fp32.encode(queries, 'query'), int8.encode(queries, 'query')
+    fp32_documents, int8_documents = fp32.encode(documents, 'document'), int8.encode(documents, 'document')
+    query_cosine = np.sum(fp32_queries * int8_queries, axis=1)
+    document_cosine = np.sum(fp32_documents * int8_documents, axis=1)
+    # What retrieval sees: int8 queries scored against the fp32 vectors already stored
+    score_error = np.abs(int8_queries @ fp32_documents.T - fp32_queries @ fp32_documents.T)
+
+    print(f"model: {settings.model_name}, threads: {torch.get_num_threads()}")
+    print(f"size:    fp32 {model_megabytes(fp32.model):7.1f} MB   int8 {model_megabytes(int8.model):7.1f} MB")
+    print(f"cosine:  queries min {query_cosine.min():.4f} mean {query_cosine.mean():.4f}   "
+          f"documents min {document_cosine.min():.4f} mean {document_cosine.mean():.4f}")
+    print(f"query-document score error: max {score_error.max():.4f} mean {score_error.mean():.4f}")
+
+    for label, embedder in (('fp32', fp32), ('int8', int8)):
+        latencies = query_latencies(embedder, queries)
+        print(f"{label} query latency: p50 {np.percentile(latencies, 50):7.2f} ms  "
+              f"p95 {np.percentile(latencies, 95):7.2f} ms")
+
+    lowest = min(query_cosine.min(), document_cosine.min())
+    if lowest < args.min_cosine:
+        print(f"parity FAILED: lowest cosine {lowest:.4f} < {args.min_cosine}")
+        sys.exit(1)
+    print("parity: ok")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Query encoding under concurrent load: every caller encoding its own query vs the micro-batching
+BatchingEmbedder, with sync (threads) and async (asyncio.gather) callers.
+
+    python -m benchmarks.query_batching --concurrency 32 --n-queries 512 --max-wait-ms 5
+"""
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+
+from interface.batching import BatchingEmbedder
+from interface.embedder import Embedder
+from interface.schemas import EmbedderSettings
+from interface.utils import load_yaml_from_file
+
+from benchmarks.embedder_encode import make_corpus
+
+
+def report(label: str, latencies: list[float], elapsed: float) -> None:
+    latencies = np.asarray(latencies) * 1000
+    print(f"{label:24} {len(latencies) / elapsed:8.1f} queries/sec   p50 {np.percentile(latencies, 50):7.2f} ms  "
+          f"p95 {np.percentile(latencies, 95):7.2f} ms  p99 {np.percentile(latencies, 99):7.2f} ms")
+
+
+def timed_encode(embedder, query: str) -> float:
+    start = time.perf_counter()
+    embedder.encode([query], 'query')
+    return time.perf_counter() - start
+
+
+def run_threads(embedder, queries: list[str], concurrency: int) -> tuple[list[float], float]:
+    with ThreadPoolExecutor(concurrency) as pool:
+        start = time.perf_counter()
+        latencies = list(pool.map(lambda query: timed_encode(embedder, query), queries))
+        return latencies, time.perf_counter() - start
+
+
+async def run_async(embedder: BatchingEmbedder, queries: list[str], concurrency: int) -> tuple[list[float], float]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(query: str) -> float:
+        async with semaphore:
+            start = time.perf_counter()
+            await embedder.encode_async([query], 'query')
+            return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(one(query) for query in queries))
+    return latencies, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', default='interface/config.yml')
+    parser.add_argument('--model-name', default=None, help='overrides embedding_model.model_name')
+    parser.add_argument('--n-queries', type=int, default=256)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--max-batch-size', type=int, default=32)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    config = load_yaml_from_file(args.config)
+    if args.model_name:
+        config['embedding_model']['model_name'] = args.model_name
+    embedder = Embedder(EmbedderSettings(**config['embedding_model']))
+    queries = [' '.join(sentence.split()[:12]) for sentence in make_corpus(args.n_queries, seed=1)]
+    embedder.encode(queries[:4], 'query')  # warm-up
+
+    print(f"{len(queries)} queries, concurrency {args.concurrency}, threads {torch.get_num_threads()}")
+    report('direct, threads', *run_threads(embedder, queries, args.concurrency))
+
+    batching = BatchingEmbedder(embedder, args.max_batch_size, args.max_wait_ms)
+    try:
+        report('batching, threads', *run_threads(batching, queries, args.concurrency))
+        report('batching, asyncio', *asyncio.run(run_async(batching, queries, args.concurrency)))
+        print(f"batching stats: {batching.stats()}")
+
+        expected = embedder.encode(queries, 'query')
+        batched = np.concatenate([batching.encode([query], 'query') for query in queries[:8]])
+        print(f"max abs difference to unbatched encode: {np.abs(batched - expected[:8]).max():.2e}")
+    finally:
+        batching.close()
+
+
+if __name__ == '__main__':
+    main()
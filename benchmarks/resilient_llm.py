@@ -0,0 +1,109 @@
+"""
+Tail latency of LLM generation against the local fake GigaChat server with a slow first-token tail and
+injected 503s: the bare client vs ResilientLLMClient without and with hedging, async callers. Hedges only go
+into free slots, so --concurrency has to stay below llm_client.max_concurrency for them to fire.
+
+    python -m benchmarks.resilient_llm --n-requests 400 --concurrency 8 --slow-rate 0.03 --error-rate 0.03
+"""
+import argparse
+import asyncio
+import copy
+import time
+
+import numpy as np
+from gigachat import GigaChat
+from gigachat.models import Chat, Messages, MessagesRole
+from prometheus_client import REGISTRY
+
+from interface.resilient_llm import ResilientLLMClient
+from interface.utils import load_yaml_from_file
+
+from benchmarks.fake_gigachat_server import FakeGigaChatServer
+
+EVENTS = ("retry", "hedge", "hedge_won", "timeout", "rejected")
+
+
+def event_counts() -> dict[str, float]:
+    return {event: REGISTRY.get_sample_value("faplrag_llm_client_events_total", {"event": event}) or 0.0
+            for event in EVENTS}
+
+
+async def generate(llm_client, chat: Chat) -> tuple[float, float]:
+    start = time.perf_counter()
+    first_token = None
+    async for chunk in llm_client.astream(chat):
+        if first_token is None and chunk.choices[0].delta.content:
+            first_token = time.perf_counter() - start
+    return first_token, time.perf_counter() - start
+
+
+async def run(llm_client, chat: Chat, n_requests: int, concurrency: int) -> tuple[list, list, int]:
+    limit = asyncio.Semaphore(concurrency)
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        async with limit:
+            try:
+                return await generate(llm_client, chat)
+            except Exception:
+                errors += 1
+                return None
+
+    results = [result for result in await asyncio.gather(*(one() for _ in range(n_requests))) if result]
+    return [ttft for ttft, _ in results], [total for _, total in results], errors
+
+
+def report(label: str, first_tokens: list, totals: list, errors: int, n_upstream: int, events: dict) -> None:
+    first_tokens, totals = np.asarray(first_tokens) * 1000, np.asarray(totals) * 1000
+    print(f"{label:22} errors {errors:4}  upstream requests {n_upstream:5}  "
+          f"ttft p95 {np.percentile(first_tokens, 95):7.1f} ms  total p50 {np.percentile(totals, 50):7.1f} ms  "
+          f"p95 {np.percentile(totals, 95):7.1f} ms  p99 {np.percentile(totals, 99):7.1f} ms")
+    if any(events.values()):
+        print(f"{'':22} {', '.join(f'{event} {int(count)}' for event, count in events.items())}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', default='interface/config.yml')
+    parser.add_argument('--n-requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--first-token-ms', type=float, default=80.0)
+    parser.add_argument('--token-ms', type=float, default=2.0)
+    parser.add_argument('--slow-rate', type=float, default=0.03)
+    parser.add_argument('--slow-first-token-ms', type=float, default=2000.0)
+    parser.add_argument('--error-rate', type=float, default=0.03)
+    args = parser.parse_args()
+
+    client_config = load_yaml_from_file(args.config)["llm_client"]
+    client_config["backoff_base_seconds"] = 0.05
+    server = FakeGigaChatServer(first_token_ms=args.first_token_ms, token_ms=args.token_ms,
+                                slow_rate=args.slow_rate, slow_first_token_ms=args.slow_first_token_ms,
+                                error_rate=args.error_rate).start()
+    chat = Chat(messages=[Messages(role=MessagesRole.USER, content="Кто забил больше всех в сезоне?")])
+
+    def make_client() -> GigaChat:
+        return GigaChat(base_url=server.base_url, access_token="fake", model="GigaChat", verify_ssl_certs=False,
+                        timeout=client_config["read_timeout_seconds"], max_connections=4 * args.concurrency)
+
+    hedged_config = copy.deepcopy(client_config)
+    hedged_config["hedging"]["enabled"] = True
+    clients = {
+        "bare GigaChat": make_client(),
+        "resilient": ResilientLLMClient(make_client(), client_config),
+        "resilient + hedging": ResilientLLMClient(make_client(), hedged_config),
+    }
+    print(f"{args.n_requests} requests, concurrency {args.concurrency}, {args.slow_rate:.0%} slow "
+          f"({args.slow_first_token_ms:.0f} ms first token), {args.error_rate:.0%} 503s")
+    for label, llm_client in clients.items():
+        # Fills the first-token window the hedge delay is computed from
+        asyncio.run(run(llm_client, chat, client_config["hedging"]["window"], args.concurrency))
+        events, n_upstream = event_counts(), server.n_requests
+        first_tokens, totals, errors = asyncio.run(run(llm_client, chat, args.n_requests, args.concurrency))
+        after = event_counts()
+        report(label, first_tokens, totals, errors, server.n_requests - n_upstream,
+               {event: after[event] - events[event] for event in EVENTS})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Scraper throughput against the local fapl.ru stand-in: one worker vs the concurrent fetcher,
+with a cold and a warm on-disk cache. The stand-in serves synthetic pages (see benchmarks/fapl_standin.py),
+so the numbers show fetching and caching overhead at the simulated latency, not throughput on the real site.
+
+    python -m benchmarks.scraper --latency-ms 50 --workers 16
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+# utils modules import each other the way the Airflow workers see them
+sys.path[:0] = [str(ROOT / 'utils'), str(ROOT / 'interface')]
+
+from fetcher import Fetcher  # noqa: E402
+from parser import get_posts  # noqa: E402
+
+from benchmarks.fapl_standin import FaplStandIn  # noqa: E402
+
+
+def run(server: FaplStandIn, n_months: int, backend: str, cache_dir: str | None,
+        **fetcher_kwargs) -> tuple[int, float, int]:
+    server.n_requests = 0
+    with Fetcher(cache_dir=cache_dir, requests_per_second=None, **fetcher_kwargs) as fetcher:
+        start = time.perf_counter()
+        posts = get_posts(n_months, fetcher=fetcher, base_url=server.base_url, backend=backend)
+        elapsed = time.perf_counter() - start
+    return len(posts), elapsed, server.n_requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency-ms', type=float, default=50.0, help='simulated server latency per request')
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--n-months', type=int, default=2)
+    parser.add_argument('--backend', default='lxml', help='parser backend, see parser.PARSER_BACKENDS')
+    args = parser.parse_args()
+
+    server = FaplStandIn(('127.0.0.1', 0), latency=args.latency_ms / 1000)
+    server.start()
+
+    try:
+        n_posts, elapsed, n_requests = run(server, args.n_months, args.backend, None,
+                                           max_workers=1, per_host_concurrency=1)
+        print(f"sequential:          {n_posts} posts in {elapsed:6.2f}s ({n_posts / elapsed:7.1f} posts/sec), "
+              f"{n_requests} requests")
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for label in ('concurrent, cold', 'concurrent, warm'):
+                n_posts, elapsed, n_requests = run(server, args.n_months, args.backend, cache_dir,
+                                                   max_workers=args.workers, per_host_concurrency=args.workers)
+                print(f"{label + ':':20} {n_posts} posts in {elapsed:6.2f}s ({n_posts / elapsed:7.1f} posts/sec), "
+                      f"{n_requests} requests")
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
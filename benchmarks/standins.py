@@ -0,0 +1,231 @@
+"""
+Offline stand-ins for the services the RAG pipeline talks to: a tiny local transformer, a fake GigaChat
+that streams canned tokens, in-memory vector and full-text stores and a session that only records writes.
+"""
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import AsyncIterator, Iterator
+
+import numpy as np
+from opensearchpy.serializer import JSONSerializer
+
+from interface.schemas import Context, Post
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def build_tiny_model(path: str | Path, corpus: list[str], hidden_size: int = 64, num_layers: int = 2,
+                     vocab_size: int = 2000, seed: int = 0) -> Path:
+    """
+    Saves a randomly initialized BERT of a few hundred kB with a WordPiece fast tokenizer trained on corpus,
+    loadable by Embedder like any checkpoint. Timings are about pipeline overhead, not model quality.
+    """
+    import torch
+    from tokenizers import Tokenizer, models, normalizers, pre_tokenizers, processors, trainers
+    from transformers import BertConfig, BertModel, PreTrainedTokenizerFast
+
+    special_tokens = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+    tokenizer = Tokenizer(models.WordPiece(unk_token="[UNK]"))
+    tokenizer.normalizer = normalizers.BertNormalizer(lowercase=True)
+    tokenizer.pre_tokenizer = pre_tokenizers.BertPreTokenizer()
+    tokenizer.train_from_iterator(corpus, trainers.WordPieceTrainer(vocab_size=vocab_size,
+                                                                    special_tokens=special_tokens))
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single="[CLS] $A [SEP]", pair="[CLS] $A [SEP] $B [SEP]",
+        special_tokens=[(token, tokenizer.token_to_id(token)) for token in ("[CLS]", "[SEP]")],
+    )
+
+    torch.manual_seed(seed)
+    model = BertModel(BertConfig(vocab_size=tokenizer.get_vocab_size(), hidden_size=hidden_size,
+                                 num_hidden_layers=num_layers, num_attention_heads=2,
+                                 intermediate_size=hidden_size * 2, max_position_embeddings=512))
+
+    path = Path(path)
+    model.save_pretrained(path)
+    PreTrainedTokenizerFast(tokenizer_object=tokenizer, model_max_length=512, unk_token="[UNK]", pad_token="[PAD]",
+                            cls_token="[CLS]", sep_token="[SEP]", mask_token="[MASK]").save_pretrained(path)
+    return path
+
+
+def make_chunk(content: str | None, usage: SimpleNamespace | None = None) -> SimpleNamespace:
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))], usage=usage)
+
+
+class FakeGigaChat:
+    """
+    Streams a canned answer word by word: first_token_ms before the first chunk, token_ms between chunks.
+    Implements the stream/astream calls llm_client makes; the last chunk carries word-count token usage.
+    """
+
+    def __init__(self, answer: str, first_token_ms: float = 0.0, token_ms: float = 0.0):
+        self.tokens = re.findall(r'\S+\s*', answer)
+        self.first_token = first_token_ms / 1000
+        self.token_delay = token_ms / 1000
+        self.n_requests = 0
+
+    def usage(self, chat) -> SimpleNamespace:
+        prompt_tokens = sum(len(message.content.split()) for message in chat.messages)
+        return SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=len(self.tokens),
+                               total_tokens=prompt_tokens + len(self.tokens))
+
+    def stream(self, chat) -> Iterator[SimpleNamespace]:
+        self.n_requests += 1
+        time.sleep(self.first_token)
+        for i, token in enumerate(self.tokens):
+            if i:
+                time.sleep(self.token_delay)
+            yield make_chunk(token)
+        yield make_chunk(None, self.usage(chat))
+
+    async def astream(self, chat) -> AsyncIterator[SimpleNamespace]:
+        self.n_requests += 1
+        await asyncio.sleep(self.first_token)
+        for i, token in enumerate(self.tokens):
+            if i:
+                await asyncio.sleep(self.token_delay)
+            yield make_chunk(token)
+        yield make_chunk(None, self.usage(chat))
+
+
+class InMemoryVectorStore:
+    """
+    Exact cosine search over post vectors, a drop-in for retrieval.search_by_vector and search_by_vector_batch.
+    """
+
+    def __init__(self, posts: list[Post], vectors: np.ndarray):
+        self.posts = posts
+        self.vectors = np.asarray(vectors, dtype=np.float32)
+
+    def search_by_vector(self, db, query_vector: list[float], config: dict) -> list[Context]:
+        from interface.retrieval import build_context_from_vectordb_response
+
+        k = min(config["retrieval"]["top_k_vector"], len(self.posts))
+        distances = 1 - self.vectors @ np.asarray(query_vector, dtype=np.float32)
+        nearest = np.argsort(distances)[:k]
+        return [build_context_from_vectordb_response(self.posts[i]) for i in nearest
+                if distances[i] < config["retrieval"]["similarity_threshold"]]
+
+    def search_by_vector_batch(self, db, query_vectors: list[list[float]], config: dict) -> list[list[Context]]:
+        return [self.search_by_vector(db, query_vector, config) for query_vector in query_vectors]
+
+
+class NullSession:
+    """
+    Session stand-in for code that opens a session it won't use because the store is patched out.
+    """
+
+    def close(self) -> None:
+        pass
+
+
+class RecordingSession(NullSession):
+    """
+    Accepts the loader's insert/upsert/delete statements and only counts the rows written.
+    """
+
+    def __init__(self):
+        self.n_statements = 0
+        self.n_rows = 0
+        self.n_commits = 0
+
+    def execute(self, statement, params=None):
+        self.n_statements += 1
+        self.n_rows += len(params) if isinstance(params, list) else 1
+
+    def commit(self) -> None:
+        self.n_commits += 1
+
+    def rollback(self) -> None:
+        pass
+
+
+class InMemoryOpenSearch:
+    """
+    Enough of the OpenSearch client for the loader and the full-text retriever: index creation, bulk indexing
+    and the bool/multi_match query (also through msearch), scored by (title-boosted) term overlap instead of BM25.
+    A bulk request takes bulk_ms, like a round trip to a cluster, and rejects rejection_rate of its documents
+    with 429 as a full write queue would.
+    """
+
+    def __init__(self, bulk_ms: float = 0.0, rejection_rate: float = 0.0, seed: int = 0):
+        self.bulk_delay = bulk_ms / 1000
+        self.rejection_rate = rejection_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.n_bulk_requests = 0
+        self.n_rejected = 0
+        self.documents: dict[str, dict] = {}
+        self.transport = SimpleNamespace(serializer=JSONSerializer())  # used by opensearchpy.helpers.bulk
+        self._terms: dict[str, tuple[set[str], set[str]]] = {}
+        self.settings: dict[str, str | None] = {"index.number_of_replicas": "1"}
+        self.indices = SimpleNamespace(
+            exists=lambda index: True, create=lambda index, body: None,
+            get_mapping=lambda index: {index: {"mappings": {"properties": {}}}},
+            get_settings=lambda index, name=None, flat_settings=False: {index: {"settings": {
+                key: value for key, value in self.settings.items() if value is not None}}},
+            put_settings=lambda index, body: self.settings.update(body),
+            refresh=lambda index: None, forcemerge=lambda index, **kwargs: None,
+        )
+
+    @staticmethod
+    def terms(text: str) -> set[str]:
+        return set(TOKEN_PATTERN.findall(text.lower()))
+
+    def add(self, document: dict) -> None:
+        doc_id = str(document["uid"])
+        self.documents[doc_id] = document
+        self._terms[doc_id] = (self.terms(document["title"]), self.terms(document["text_content"]))
+
+    def ping(self) -> bool:
+        return True
+
+    def bulk(self, body, **kwargs) -> dict:
+        time.sleep(self.bulk_delay)
+        lines = [json.loads(line) if isinstance(line, str) else line
+                 for line in (body.splitlines() if isinstance(body, str) else body)]
+        items = []
+        with self.lock:
+            self.n_bulk_requests += 1
+            for action, source in zip(lines[::2], lines[1::2]):
+                op_type, meta = next(iter(action.items()))
+                if self.rng.random() < self.rejection_rate:
+                    self.n_rejected += 1
+                    items.append({op_type: {"_id": meta.get("_id"), "status": 429,
+                                            "error": {"type": "es_rejected_execution_exception"}}})
+                    continue
+                if op_type == "update":
+                    source = {**self.documents.get(str(meta["_id"]), {}), **source["doc"]}
+                self.add(source)
+                items.append({op_type: {"_id": meta.get("_id"), "status": 201}})
+        return {"errors": any(next(iter(item.values()))["status"] >= 300 for item in items), "items": items}
+
+    def search(self, index: str, body: dict, params: dict | None = None) -> dict:
+        should = body["query"]["bool"]["should"]
+        query_terms = self.terms(should[0]["multi_match"]["query"])
+        tag = should[1]["term"]["tags"] if len(should) > 1 else None
+
+        scored = []
+        for doc_id, (title_terms, text_terms) in self._terms.items():
+            score = 2 * len(query_terms & title_terms) + len(query_terms & text_terms)
+            if tag is not None and tag in self.documents[doc_id]["tags"]:
+                score += 1
+            if score:
+                scored.append((score, doc_id))
+        scored.sort(reverse=True)
+
+        excludes = set(body.get("_source", {}).get("excludes", []))
+        return {"hits": {"hits": [
+            {"_id": doc_id, "_score": score,
+             "_source": {key: value for key, value in self.documents[doc_id].items() if key not in excludes}}
+            for score, doc_id in scored[:body["size"]]
+        ]}}
+
+    def msearch(self, body: list[dict], params: dict | None = None) -> dict:
+        return {"responses": [self.search(header["index"], request, params)
+                              for header, request in zip(body[::2], body[1::2])]}
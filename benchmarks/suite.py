@@ -0,0 +1,257 @@
+"""
+Offline component benchmarks: the embedder, prompt building and generation, retrieval, parsing and loading,
+all against the local stand-ins in benchmarks/standins.py, so nothing touches the network.
+
+Prints one JSON document with throughput and p50/p95/p99 latency per benchmark; compare two runs to catch
+regressions.
+
+    python -m benchmarks.suite --output bench.json
+    python -m benchmarks.suite --only retrieval llm --llm-first-token-ms 300 --llm-token-ms 20
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import torch
+
+# The API modules come first: they import the repo's utils package, which the flat Airflow path would shadow
+import interface.retrieval as retrieval
+from interface.chunker import TokenChunker
+from interface.compression import compress_contexts
+from interface.embedder import Embedder
+from interface.llm_client import build_prompt, generate_response, generate_response_async
+from interface.schemas import Context, EmbedderSettings, Post
+from interface.utils import load_yaml_from_file
+
+ROOT = Path(__file__).resolve().parent.parent
+# utils modules import each other the way the Airflow workers see them
+sys.path[:0] = [str(ROOT / 'utils'), str(ROOT / 'interface')]
+
+from elastic_loader import update_search  # noqa: E402
+from loader import store_vectors  # noqa: E402
+from parser import PARSER_BACKENDS, parse_daily_posts_links, parse_post  # noqa: E402
+
+from benchmarks.embedder_encode import WORDS, make_corpus  # noqa: E402
+from benchmarks.parser import BASE_URL, load_fixtures  # noqa: E402
+from benchmarks.standins import (FakeGigaChat, InMemoryOpenSearch, InMemoryVectorStore, NullSession,  # noqa: E402
+                                 RecordingSession, build_tiny_model)
+
+TAGS = ("АПЛ", "Арсенал", "Челси", "трансферы", "травмы")
+CANNED_ANSWER = ' '.join(make_corpus(1, seed=7)[0].split()[:60])
+GROUPS = ("embedder", "llm", "retrieval", "parser", "loader")
+
+
+def summarize(name: str, latencies: list[float], items_per_call: int = 1) -> dict:
+    latencies_ms = np.asarray(latencies) * 1000
+    total = float(np.sum(latencies))
+    return {
+        "name": name,
+        "calls": len(latencies),
+        "items_per_call": items_per_call,
+        "throughput_per_sec": len(latencies) * items_per_call / total if total else None,
+        "latency_ms": {
+            "mean": float(latencies_ms.mean()),
+            "p50": float(np.percentile(latencies_ms, 50)),
+            "p95": float(np.percentile(latencies_ms, 95)),
+            "p99": float(np.percentile(latencies_ms, 99)),
+        },
+    }
+
+
+def measure(name: str, fn, repeats: int, items_per_call: int = 1, warmup: int = 2) -> dict:
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return summarize(name, latencies, items_per_call)
+
+
+def measure_async(name: str, fn, repeats: int, items_per_call: int = 1, warmup: int = 2) -> dict:
+    async def run() -> list[float]:
+        for _ in range(warmup):
+            await fn()
+        latencies = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            await fn()
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    return summarize(name, asyncio.run(run()), items_per_call)
+
+
+def make_posts(n_posts: int, seed: int = 0) -> list[Post]:
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    return [Post(uid=100000 + i, title=' '.join(rng.choices(WORDS, k=6)), text_content=text,
+                 tags=rng.sample(TAGS, k=2), n_visits=rng.randint(0, 5000), author='fapl',
+                 dt=start + timedelta(hours=i))
+            for i, text in enumerate(make_corpus(n_posts, seed=seed))]
+
+
+def make_queries(n_queries: int) -> list[str]:
+    return [' '.join(sentence.split()[:8]) for sentence in make_corpus(n_queries, seed=11)]
+
+
+def bench_embedder(embedder: Embedder, args) -> list[dict]:
+    queries = make_queries(args.repeats)
+    documents = make_corpus(args.batch_documents, seed=5)
+    query_iter = iter(queries * 3)
+    return [
+        measure("embedder.encode[query]", lambda: embedder.encode([next(query_iter)], "query"), args.repeats),
+        measure("embedder.encode[documents]", lambda: embedder.encode(documents, "document"),
+                max(args.repeats // 10, 3), items_per_call=len(documents)),
+    ]
+
+
+def bench_llm(config: dict, args) -> list[dict]:
+    llm_client = FakeGigaChat(CANNED_ANSWER, args.llm_first_token_ms, args.llm_token_ms)
+    contexts = [Context(uid=i, text=text, title=f"post {i}", tags=[], n_visits=0, dt=datetime(2025, 1, 1),
+                        href="", source="vector") for i, text in enumerate(make_corpus(5, seed=3))]
+    query = make_queries(1)[0]
+    repeats = max(args.repeats // 5, 5)
+    return [
+        measure("llm.build_prompt", lambda: build_prompt([context.text for context in contexts], query),
+                args.repeats * 10),
+        measure("llm.generate_response", lambda: generate_response(llm_client, contexts, query, config), repeats),
+        measure_async("llm.generate_response_async",
+                      lambda: generate_response_async(llm_client, contexts, query, config), repeats),
+    ]
+
+
+def bench_retrieval(embedder: Embedder, config: dict, args) -> list[dict]:
+    posts = make_posts(args.n_posts)
+    vector_store = InMemoryVectorStore(posts, embedder.encode([post.text_content for post in posts], "document"))
+    os_client = InMemoryOpenSearch()
+    update_search(posts, os_client)
+    retrieval.search_by_vector = vector_store.search_by_vector
+    retrieval.search_by_vector_batch = vector_store.search_by_vector_batch
+    retrieval.SessionLocal = NullSession
+
+    rng = random.Random(0)
+    candidates = [retrieval.build_context_from_vectordb_response(post) for post in posts]
+    contexts = [rng.choice(candidates) for _ in range(config["retrieval"]["top_k_vector"] * 4)]
+    queries = itertools.cycle(make_queries(args.repeats))
+    batch = make_queries(args.batch_queries)
+    return [
+        measure("retrieval.deduplicate_and_sort", lambda: retrieval.deduplicate_and_sort(contexts),
+                args.repeats * 10, items_per_call=len(contexts)),
+        measure("retrieval.retrieve_contexts",
+                lambda: retrieval.retrieve_contexts(next(queries), embedder, config, os_client), args.repeats),
+        measure_async("retrieval.retrieve_contexts_async",
+                      lambda: retrieval.retrieve_contexts_async(next(queries), embedder, config, os_client),
+                      args.repeats),
+        measure_async("retrieval.retrieve_contexts_batch_async",
+                      lambda: retrieval.retrieve_contexts_batch_async(batch, embedder, config, os_client),
+                      max(args.repeats // 10, 3), items_per_call=len(batch)),
+        measure("retrieval.compress_contexts",
+                lambda: compress_contexts(contexts[:config["retrieval"]["top_k"]], next(queries), embedder, config),
+                args.repeats),
+    ]
+
+
+def bench_parser(args) -> list[dict]:
+    # Synthetic fixture pages, not fapl.ru captures (see benchmarks/parser.py)
+    calendar, posts = load_fixtures()
+    pages = list(posts.items())
+    results = []
+    for backend in PARSER_BACKENDS:
+        page = iter(pages * (args.repeats + 3))
+
+        def parse_next_post():
+            uid, html = next(page)
+            parse_post(html, uid, backend)
+
+        results.append(measure(f"parser.parse_post[{backend}]", parse_next_post, args.repeats))
+        results.append(measure(f"parser.parse_daily_posts_links[{backend}]",
+                               lambda: parse_daily_posts_links(calendar, BASE_URL, backend), args.repeats))
+    return results
+
+
+def bench_loader(embedder: Embedder, config: dict, args) -> list[dict]:
+    posts = make_posts(args.n_posts, seed=1)
+    chunker = None
+    if config["chunking"]["enabled"]:
+        chunker = TokenChunker(embedder.tokenizer, config["chunking"]["chunk_size"], config["chunking"]["overlap"])
+    repeats = 3
+    return [
+        measure("loader.store_vectors",
+                lambda: store_vectors(RecordingSession(), posts, embedder, config["data"]["ingest_chunk_size"],
+                                      chunker),
+                repeats, items_per_call=len(posts), warmup=1),
+        measure("loader.update_search", lambda: update_search(posts, InMemoryOpenSearch()), repeats,
+                items_per_call=len(posts), warmup=1),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', default='interface/config.yml')
+    parser.add_argument('--only', nargs='+', choices=GROUPS, default=GROUPS)
+    parser.add_argument('--model-name', default=None,
+                        help='a local checkpoint to benchmark instead of the generated tiny model')
+    parser.add_argument('--repeats', type=int, default=50)
+    parser.add_argument('--n-posts', type=int, default=300)
+    parser.add_argument('--batch-documents', type=int, default=64)
+    parser.add_argument('--batch-queries', type=int, default=32)
+    parser.add_argument('--llm-first-token-ms', type=float, default=0.0)
+    parser.add_argument('--llm-token-ms', type=float, default=0.0)
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--output', default=None, help='write the JSON here instead of stdout')
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    config = load_yaml_from_file(args.config)
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        if args.model_name is None:
+            corpus = make_corpus(200, seed=0) + [' '.join(TAGS)]
+            model_name = str(build_tiny_model(model_dir, corpus))
+        else:
+            model_name = args.model_name
+        config['embedding_model'].update(model_name=model_name, model_type='')
+        embedder = Embedder(EmbedderSettings(**config['embedding_model']))
+
+        results = []
+        if "embedder" in args.only:
+            results += bench_embedder(embedder, args)
+        if "llm" in args.only:
+            results += bench_llm(config, args)
+        if "retrieval" in args.only:
+            results += bench_retrieval(embedder, config, args)
+        if "parser" in args.only:
+            results += bench_parser(args)
+        if "loader" in args.only:
+            results += bench_loader(embedder, config, args)
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec='seconds'),
+        "environment": {"python": platform.python_version(), "torch": torch.__version__,
+                        "cpu_count": os.cpu_count(), "torch_threads": torch.get_num_threads()},
+        "settings": {key: value for key, value in vars(args).items() if key != 'output'},
+        "model": model_name if args.model_name else "generated tiny BERT",
+        "results": results,
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(output, encoding='utf-8')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
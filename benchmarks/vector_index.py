@@ -0,0 +1,83 @@
+"""
+Recall and latency of the pgvector ANN index against exact search, over a running Postgres.
+
+Stored vectors (with a little noise) serve as queries. Exact results come from a sequential scan
+(index scans disabled), ANN results from the managed index at several search breadths.
+
+    python -m benchmarks.vector_index --table post_chunks --k 12 --breadth 16 40 64 128
+"""
+import argparse
+import time
+
+import numpy as np
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from interface.utils import load_yaml_from_file
+from utils.database import SQLALCHEMY_DATABASE_URL
+
+
+def nearest(db, table: str, query: list[float], k: int, setting: str | None) -> tuple[list[int], float]:
+    key = "uid" if table == "posts" else "id"
+    start = time.perf_counter()
+    with db.begin():
+        if setting is None:
+            db.execute(text("SET LOCAL enable_indexscan = off"))
+        else:
+            db.execute(text(f"SET LOCAL {setting}"))
+        ids = db.execute(
+            text(f"SELECT {key} FROM {table} ORDER BY vector <=> CAST(:query AS vector) LIMIT :k"),
+            {"query": str(query), "k": k},
+        ).scalars().all()
+    return ids, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', default='interface/config.yml')
+    parser.add_argument('--db-url', default=SQLALCHEMY_DATABASE_URL)
+    parser.add_argument('--table', default='posts', choices=('posts', 'post_chunks'))
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--n-queries', type=int, default=100)
+    parser.add_argument('--noise', type=float, default=0.05)
+    parser.add_argument('--breadth', type=int, nargs='+', default=None,
+                        help='ef_search (hnsw) or probes (ivfflat) values, default: the configured one')
+    args = parser.parse_args()
+
+    index_config = load_yaml_from_file(args.config)['vector_index']
+    method = index_config['method']
+    if method not in ('hnsw', 'ivfflat'):
+        parser.error(f"vector_index.method is '{method}', nothing to compare against exact search")
+    setting_name, configured = (('hnsw.ef_search', index_config['hnsw']['ef_search']) if method == 'hnsw'
+                                else ('ivfflat.probes', index_config['ivfflat']['probes']))
+
+    db = sessionmaker(bind=create_engine(args.db_url))()
+    rng = np.random.default_rng(0)
+    rows = db.execute(text(f"SELECT CAST(vector AS real[]) FROM {args.table} ORDER BY random() LIMIT :n"),
+                      {"n": args.n_queries}).scalars().all()
+    db.rollback()
+    queries = []
+    for row in rows:
+        vector = np.asarray(row, dtype=np.float32) + rng.normal(0, args.noise, len(row)).astype(np.float32)
+        queries.append((vector / np.linalg.norm(vector)).tolist())
+
+    exact = [nearest(db, args.table, query, args.k, None) for query in queries]
+    exact_latency = np.array([latency for _, latency in exact]) * 1000
+    print(f"{args.table}, {len(queries)} queries, k={args.k}, method={method}")
+    print(f"exact:                 recall 1.000  p50 {np.percentile(exact_latency, 50):7.2f} ms  "
+          f"p95 {np.percentile(exact_latency, 95):7.2f} ms")
+
+    for breadth in args.breadth or [configured]:
+        approximate = [nearest(db, args.table, query, args.k, f"{setting_name} = {int(breadth)}") for query in queries]
+        recall = np.mean([len(set(ids) & set(exact_ids)) / max(len(exact_ids), 1)
+                          for (ids, _), (exact_ids, _) in zip(approximate, exact)])
+        latency = np.array([latency for _, latency in approximate]) * 1000
+        label = f"{setting_name} = {breadth}"
+        print(f"{label:22} recall {recall:.3f}  p50 {np.percentile(latency, 50):7.2f} ms  "
+              f"p95 {np.percentile(latency, 95):7.2f} ms")
+
+    db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, NamedTuple
+
+import numpy as np
+
+from interface.embedder import IEmbedder
+
+logger = logging.getLogger(__name__)
+
+
+class EncodeRequest(NamedTuple):
+    sentences: List[str]
+    doc_type: str
+    future: Future
+
+
+class BatchingEmbedder(IEmbedder):
+    """
+    Coalesces concurrent encode calls into one forward pass of the wrapped embedder.
+
+    A single worker thread takes the first waiting request, then collects more for up to max_wait_ms
+    or until max_batch_size sentences are queued, encodes each doc type in one call and hands every
+    caller its own rows. Sync callers block on encode, async callers await encode_async.
+    """
+    supports_async = True
+
+    def __init__(self, embedder: IEmbedder, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.embedder = embedder
+        self.device = embedder.device
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.n_batches = 0
+        self.n_sentences = 0
+        self._queue: queue.Queue[EncodeRequest | None] = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="batching-encoder", daemon=True)
+        self._worker.start()
+
+    def __getattr__(self, name):
+        return getattr(self.embedder, name)
+
+    def submit(self, sentences: List[str], doc_type: str) -> Future:
+        future: Future = Future()
+        if not sentences:
+            future.set_result(self.embedder.encode([], doc_type))
+            return future
+        self._queue.put(EncodeRequest(list(sentences), doc_type, future))
+        return future
+
+    def encode(self, sentences: List[str], doc_type: str) -> np.ndarray:
+        return self.submit(sentences, doc_type).result()
+
+    async def encode_async(self, sentences: List[str], doc_type: str) -> np.ndarray:
+        return await asyncio.wrap_future(self.submit(sentences, doc_type))
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._worker.join()
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.n_batches,
+            "sentences": self.n_sentences,
+            "mean_batch_size": self.n_sentences / self.n_batches if self.n_batches else 0.0,
+        }
+
+    def _collect(self, first: EncodeRequest) -> tuple[list[EncodeRequest], bool]:
+        requests = [first]
+        size = len(first.sentences)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                return requests, True
+            requests.append(request)
+            size += len(request.sentences)
+        return requests, False
+
+    def _encode(self, requests: list[EncodeRequest]) -> None:
+        by_doc_type: dict[str, list[EncodeRequest]] = {}
+        for request in requests:
+            if request.future.set_running_or_notify_cancel():
+                by_doc_type.setdefault(request.doc_type, []).append(request)
+
+        for doc_type, group in by_doc_type.items():
+            try:
+                embeddings = self.embedder.encode([s for request in group for s in request.sentences], doc_type)
+            except Exception as e:
+                for request in group:
+                    request.future.set_exception(e)
+                continue
+
+            self.n_batches += 1
+            self.n_sentences += len(embeddings)
+            offset = 0
+            for request in group:
+                request.future.set_result(embeddings[offset:offset + len(request.sentences)])
+                offset += len(request.sentences)
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            requests, stopping = self._collect(first)
+            self._encode(requests)
+            logger.debug(f"Encoded a batch of {len(requests)} requests")
@@ -0,0 +1,232 @@
+import abc
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Hashable
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    Bounded thread-safe LRU cache whose entries also expire after a fixed time-to-live.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float | None = None, timer: Callable[[], float] = time.monotonic):
+        if max_size <= 0:
+            raise ValueError(f"max_size must be positive, got {max_size}")
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._timer = timer
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            expires_at, value = entry
+            if expires_at < self._timer():
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        expires_at = self._timer() + self.ttl_seconds if self.ttl_seconds else float('inf')
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+@dataclass
+class CachedAnswer:
+    vector: np.ndarray
+    answer: str
+    contexts: list
+    data_version: int
+    expires_at: float
+    hits: int = field(default=0)
+
+    @property
+    def context_uids(self) -> list[int]:
+        return [context.uid for context in self.contexts]
+
+
+class SemanticCache(abc.ABC):
+    """
+    Answers questions that are semantically close to an already answered one.
+
+    Vectors are expected to be L2-normalized, so the dot product is the cosine similarity.
+    Entries expire by TTL and are dropped once data_version_fn reports a newer corpus
+    version (e.g. the time of the latest write to posts) than the one they were answered from.
+    Backends implement storage and nearest-neighbour search.
+    """
+
+    def __init__(self, similarity_threshold: float, ttl_seconds: float | None = None,
+                 data_version_fn: Callable[[], int] | None = None, version_check_seconds: float = 60.0,
+                 timer: Callable[[], float] = time.monotonic):
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.data_version_fn = data_version_fn
+        self.version_check_seconds = version_check_seconds
+        self._timer = timer
+        self.data_version = 0
+        self._next_version_check = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @abc.abstractmethod
+    def _search(self, vector: np.ndarray, now: float) -> tuple[CachedAnswer, float] | None:
+        """Return the most similar live entry and its similarity"""
+
+    @abc.abstractmethod
+    def _add(self, entry: CachedAnswer) -> None:
+        """Store a new entry"""
+
+    @abc.abstractmethod
+    def invalidate(self, data_version: int) -> int:
+        """Drop entries answered from a corpus older than data_version, return how many were dropped"""
+
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        """Number of stored entries"""
+
+    def lookup(self, vector: np.ndarray) -> CachedAnswer | None:
+        now = self._timer()
+        self._check_data_version(now)
+
+        found = self._search(np.asarray(vector, dtype=np.float32), now)
+        if found is None or found[1] < self.similarity_threshold:
+            self.misses += 1
+            return None
+
+        entry, similarity = found
+        entry.hits += 1
+        self.hits += 1
+        logger.info(f"Semantic cache hit with similarity {similarity:.3f}")
+        return entry
+
+    def store(self, vector: np.ndarray, answer: str, contexts: list, data_version: int | None = None) -> None:
+        """
+        data_version is the version read before the answer's contexts were retrieved (see lookup).
+        An answer retrieved from a corpus that has been replaced meanwhile is not stored.
+        """
+        if data_version is None:
+            data_version = self.data_version
+        if data_version < self.data_version:
+            logger.info("The data changed while the answer was generated, not caching it")
+            return
+        expires_at = self._timer() + self.ttl_seconds if self.ttl_seconds else float('inf')
+        self._add(CachedAnswer(vector=np.asarray(vector, dtype=np.float32).copy(), answer=answer,
+                               contexts=list(contexts), data_version=data_version, expires_at=expires_at))
+
+    def _check_data_version(self, now: float) -> None:
+        if self.data_version_fn is None or now < self._next_version_check:
+            return
+        self._next_version_check = now + self.version_check_seconds
+
+        try:
+            data_version = self.data_version_fn()
+        except Exception as e:
+            logger.warning(f"Failed to check data version for semantic cache: {e}")
+            return
+
+        if data_version > self.data_version:
+            self.data_version = data_version
+            dropped = self.invalidate(data_version)
+            self.invalidations += dropped
+            if dropped:
+                logger.info(f"Posts were added or updated, dropped {dropped} cached answers")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "data_version": self.data_version,
+        }
+
+
+class InMemorySemanticCache(SemanticCache):
+    """
+    Process-local backend: brute-force similarity over a matrix of the cached question vectors.
+    """
+
+    def __init__(self, max_size: int, **kwargs):
+        super().__init__(**kwargs)
+        if max_size <= 0:
+            raise ValueError(f"max_size must be positive, got {max_size}")
+        self.max_size = max_size
+        self._entries: list[CachedAnswer] = []
+        self._matrix: np.ndarray | None = None
+        self._lock = threading.Lock()
+
+    def _keep(self, predicate: Callable[[CachedAnswer], bool]) -> int:
+        kept = [entry for entry in self._entries if predicate(entry)]
+        dropped = len(self._entries) - len(kept)
+        if dropped:
+            self._entries = kept
+            self._matrix = None
+        return dropped
+
+    def _search(self, vector: np.ndarray, now: float) -> tuple[CachedAnswer, float] | None:
+        with self._lock:
+            self._keep(lambda entry: entry.expires_at >= now)
+            if not self._entries:
+                return None
+
+            if self._matrix is None:
+                self._matrix = np.stack([entry.vector for entry in self._entries])
+            similarities = self._matrix @ vector
+            best = int(np.argmax(similarities))
+            return self._entries[best], float(similarities[best])
+
+    def _add(self, entry: CachedAnswer) -> None:
+        with self._lock:
+            self._entries.append(entry)
+            if len(self._entries) > self.max_size:
+                self._entries = self._entries[-self.max_size:]
+            self._matrix = None
+
+    def invalidate(self, data_version: int) -> int:
+        with self._lock:
+            return self._keep(lambda entry: entry.data_version >= data_version)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,29 @@
+from typing import List
+
+
+class TokenChunker:
+    """
+    Splits texts into windows of at most chunk_size tokens that overlap by overlap tokens.
+    Chunks are cut from the original text using the fast tokenizer's offsets, so no text is lost or re-spelled.
+    """
+
+    def __init__(self, tokenizer, chunk_size: int, overlap: int):
+        if not 0 <= overlap < chunk_size:
+            raise ValueError(f"overlap must be in [0, chunk_size), got overlap={overlap}, chunk_size={chunk_size}")
+        self.tokenizer = tokenizer
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+
+    def split(self, text: str) -> List[str]:
+        offsets = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)['offset_mapping']
+        if len(offsets) <= self.chunk_size:
+            return [text]
+
+        chunks = []
+        stride = self.chunk_size - self.overlap
+        for start in range(0, len(offsets), stride):
+            end = min(start + self.chunk_size, len(offsets))
+            chunks.append(text[offsets[start][0]:offsets[end - 1][1]])
+            if end == len(offsets):
+                break
+        return chunks
@@ -0,0 +1,100 @@
+import asyncio
+import contextvars
+import logging
+import re
+import time
+from concurrent.futures import Executor
+
+import numpy as np
+
+from interface.embedder import IEmbedder
+from interface.metrics import record_compression, stage
+from interface.schemas import Context
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?…])\s+|\n+')
+WORD = re.compile(r'\w')
+
+
+def split_sentences(text: str) -> list[str]:
+    # Fragments without a single word character ("...", a lone quote) are not worth a slot in the budget
+    return [sentence.strip() for sentence in SENTENCE_BOUNDARY.split(text) if WORD.search(sentence)]
+
+
+def select_sentences(scores: np.ndarray, vectors: np.ndarray, n_tokens: list[int], token_budget: int,
+                     duplicate_threshold: float) -> list[int]:
+    """
+    Greedily takes the best scoring sentences that still fit into token_budget, skipping any sentence
+    whose cosine similarity to an already taken one exceeds duplicate_threshold.
+    Returns the indices of the taken sentences.
+    """
+    selected: list[int] = []
+    remaining = token_budget
+    for i in np.argsort(-scores):
+        if n_tokens[i] > remaining:
+            continue
+        if selected and float(np.max(vectors[selected] @ vectors[i])) > duplicate_threshold:
+            continue
+        selected.append(int(i))
+        remaining -= n_tokens[i]
+        if remaining <= 0:
+            break
+    return selected
+
+
+def compress_contexts(contexts: list[Context], query: str, embedder: IEmbedder, config: dict,
+                      query_vector: list[float] | None = None) -> list[Context]:
+    """
+    Extractive compression: keeps only the context sentences closest to the query, within
+    context_compression.token_budget embedder tokens over all contexts, and without near-duplicates
+    across posts. Kept sentences stay in their original order; contexts left without any are dropped.
+    """
+    compression_config = config["context_compression"]
+    start = time.perf_counter()
+
+    sentences, owners = [], []
+    for position, context in enumerate(contexts):
+        for sentence in split_sentences(context.text):
+            sentences.append(sentence)
+            owners.append(position)
+    if not sentences:
+        return contexts
+
+    with stage("compress_contexts"):
+        # Sentences of all contexts in one encoder call, scored with a single matrix-vector product
+        vectors = embedder.encode(sentences, doc_type="document")
+        if query_vector is None:
+            query_vector = embedder.encode([query], doc_type="query")[0]
+        scores = vectors @ np.asarray(query_vector, dtype=np.float32)
+
+        n_tokens = [len(ids) for ids in embedder.tokenizer(sentences, add_special_tokens=False)["input_ids"]]
+        selected = sorted(select_sentences(scores, vectors, n_tokens, compression_config["token_budget"],
+                                           compression_config["duplicate_threshold"]))
+
+    kept: dict[int, list[str]] = {}
+    for i in selected:
+        kept.setdefault(owners[i], []).append(sentences[i])
+    compressed = [context.model_copy(update={"text": " ".join(kept[position])})
+                  for position, context in enumerate(contexts) if position in kept]
+
+    original_tokens = sum(n_tokens)
+    compressed_tokens = sum(n_tokens[i] for i in selected)
+    ratio = compressed_tokens / original_tokens if original_tokens else 1.0
+    record_compression(ratio)
+    logger.info(f"Compressed contexts to {compressed_tokens}/{original_tokens} tokens ({ratio:.0%}), "
+                f"{len(selected)}/{len(sentences)} sentences of {len(compressed)}/{len(contexts)} contexts "
+                f"in {(time.perf_counter() - start) * 1000:.1f}ms")
+    return compressed
+
+
+async def compress_contexts_async(contexts: list[Context], query: str, embedder: IEmbedder, config: dict,
+                                  executor: Executor | None = None,
+                                  query_vector: list[float] | None = None) -> list[Context]:
+    """
+    Runs compress_contexts on the encoding executor, it is as CPU-bound as query encoding.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(executor, context.run, compress_contexts, contexts, query, embedder, config,
+                                      query_vector)
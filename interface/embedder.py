@@ -1,12 +1,18 @@
 import abc
+import logging
 from typing import List
 
 import more_itertools
 import numpy as np
 import torch
 import torch.nn.functional as F
+from safetensors.torch import load_file
 from tqdm import tqdm
-from transformers import AutoModel, AutoTokenizer, XLMRobertaModel, XLMRobertaTokenizer
+from transformers import AutoConfig, AutoModel, AutoTokenizer, XLMRobertaModel
+from transformers.modeling_utils import no_init_weights
+from transformers.utils import SAFE_WEIGHTS_NAME, cached_file
+
+logger = logging.getLogger(__name__)
 
 
 class IEmbedder(abc.ABC):
@@ -25,17 +31,56 @@ class Embedder(IEmbedder):
     def __init__(self, settings):
         super().__init__()
         self._settings = settings
+        self.model_name = self._settings.model_name
         self.batch_size = self._settings.batch_size
+        self.max_length = self._settings.max_length
         self.model_type = self._settings.model_type
         self.prefix_query = self._settings.prefix_query
         self.prefix_document = self._settings.prefix_document
 
-        if self.model_type == 'e5':
-            self.model = XLMRobertaModel.from_pretrained(self._settings.model_name).to(self.device)
-            self.tokenizer = XLMRobertaTokenizer.from_pretrained(self._settings.model_name)
-        else:
-            self.model = AutoModel.from_pretrained(self._settings.model_name).to(self.device)
-            self.tokenizer = AutoTokenizer.from_pretrained(self._settings.model_name)
+        self.model = self.load_model()
+        self.model.eval()
+
+        # AutoTokenizer picks the Rust-backed fast tokenizer whenever the checkpoint ships one
+        self.tokenizer = AutoTokenizer.from_pretrained(self._settings.model_name, use_fast=True)
+        self.dimension = self.model.config.hidden_size
+
+    def load_model(self) -> torch.nn.Module:
+        model_class = XLMRobertaModel if self.model_type == 'e5' else AutoModel
+        if self._settings.mmap_weights:
+            model = self.load_mmap_model(model_class)
+            if model is not None:
+                return model.to(self.device)
+        return model_class.from_pretrained(self.model_name).to(self.device)
+
+    def load_mmap_model(self, model_class) -> torch.nn.Module | None:
+        """
+        Builds the model without random initialization and assigns its parameters straight from the
+        memory-mapped model.safetensors: pages are read on first use and shared through the page cache by
+        every process serving the same checkpoint. Returns None (caller falls back to from_pretrained)
+        for sharded or .bin-only checkpoints and for weights that don't cover the architecture.
+        """
+        weights_path = cached_file(self.model_name, SAFE_WEIGHTS_NAME, _raise_exceptions_for_missing_entries=False)
+        if weights_path is None:
+            return None
+
+        model_config = AutoConfig.from_pretrained(self.model_name)
+        with no_init_weights():
+            model = AutoModel.from_config(model_config) if model_class is AutoModel else model_class(model_config)
+
+        prefix = f"{model.base_model_prefix}."
+        state_dict = {}
+        for key, tensor in load_file(weights_path).items():
+            if tensor.is_floating_point() and tensor.dtype != torch.float32:
+                tensor = tensor.float()  # half-precision checkpoints: a copy, but still no random init
+            state_dict[key.removeprefix(prefix)] = tensor
+
+        result = model.load_state_dict(state_dict, strict=False, assign=True)
+        if result.missing_keys:
+            logger.warning(f"{weights_path} lacks {len(result.missing_keys)} weights of {type(model).__name__} "
+                           f"(e.g. {result.missing_keys[0]}), loading with from_pretrained")
+            return None
+        return model
 
     @staticmethod
     def average_pool(last_hidden_states: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
@@ -43,23 +88,39 @@ class Embedder(IEmbedder):
         return last_hidden.sum(dim=1) / attention_mask.sum(dim=1)[..., None]
 
     def encode(self, sentences: List[str], doc_type: str) -> np.ndarray:
+        """
+        Encodes sentences into L2-normalized float32 embeddings, one row per sentence in the input order.
+
+        Sentences are tokenized once, sorted by token length and batched so that every batch
+        is padded only to its own longest item. Each batch is written straight into a
+        preallocated output buffer at the original positions.
+        """
         sentences = self.preprocess_sentences(sentences, doc_type)
-        embeddings = torch.tensor([]).to(self.device)
+        embeddings = np.empty((len(sentences), self.dimension), dtype=np.float32)
+        if not sentences:
+            return embeddings
 
-        for batch in tqdm(more_itertools.chunked(sentences, self.batch_size)):
-            tokenized_batch = self.tokenizer(batch, max_length=512, padding=True,
-                                             truncation=True, return_tensors='pt').to(self.device)
+        features = self.tokenizer(sentences, max_length=self.max_length, padding=False, truncation=True)
+        input_ids = features['input_ids']
 
-            with torch.no_grad():
-                outputs = self.model(**tokenized_batch).last_hidden_state
-                embed = self.average_pool(outputs, tokenized_batch['attention_mask'])
+        # Longest first: the biggest batch runs (and fails on OOM) before any work is wasted
+        order = sorted(range(len(sentences)), key=lambda i: len(input_ids[i]), reverse=True)
+        batches = list(more_itertools.chunked(order, self.batch_size))
 
-            torch.cuda.empty_cache()
+        for batch_indices in tqdm(batches, disable=len(batches) == 1):
+            tokenized_batch = self.tokenizer.pad(
+                {key: [values[i] for i in batch_indices] for key, values in features.items()},
+                padding=True,
+                return_tensors='pt',
+            ).to(self.device)
 
-            for tensor in embed:
-                embeddings = torch.cat((embeddings, tensor.unsqueeze(0)), 0)
+            with torch.inference_mode():
+                outputs = self.model(**tokenized_batch).last_hidden_state
+                embed = F.normalize(self.average_pool(outputs, tokenized_batch['attention_mask']), dim=-1)
+
+            embeddings[batch_indices] = embed.float().cpu().numpy()
 
-        return np.array([torch.Tensor.cpu(emb) for emb in F.normalize(embeddings, dim=-1)])
+        return embeddings
 
     def preprocess_sentences(self, sentences: List[str], doc_type: str) -> List[str]:
         if doc_type == 'query':
@@ -67,3 +128,32 @@ class Embedder(IEmbedder):
         elif doc_type == 'document':
             return [self.prefix_document.format(sentence) for sentence in sentences]
         return sentences
+
+
+class QuantizedEmbedder(Embedder):
+    """
+    CPU Embedder whose Linear layers run int8 dynamic quantization: weights are stored as int8,
+    activations are quantized on the fly. Embeddings stay close to the fp32 model, see benchmarks/quantized_embedder.py.
+    """
+
+    def load_model(self) -> torch.nn.Module:
+        self.device = torch.device("cpu")
+        model = super().load_model().eval()
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+EMBEDDER_BACKENDS = {"torch": Embedder, "int8": QuantizedEmbedder}
+
+
+def configure_torch_threads(num_threads: int | None, num_interop_threads: int | None) -> None:
+    """
+    Applies the process-wide torch thread pools sizes; None keeps torch's default (all cores).
+    """
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if num_interop_threads:
+        try:
+            torch.set_num_interop_threads(num_interop_threads)
+        except RuntimeError as e:
+            # Can only be set once, before any inter-op parallel work started
+            logger.warning(f"Could not set torch inter-op threads: {e}")
@@ -1,24 +1,39 @@
 import os
 import logging
+from typing import AsyncIterator
 from dotenv import load_dotenv
 
 from gigachat import GigaChat
 from gigachat.models import Chat, Messages, MessagesRole
 
+from interface.metrics import track_llm_call
+from interface.resilient_llm import ResilientLLMClient
 from interface.schemas import Context
 
 
 logger = logging.getLogger(__name__)
 
 
-def initialize_llm_client() -> GigaChat:
+def initialize_llm_client(config: dict) -> GigaChat | ResilientLLMClient:
     """
     Initializes and returns the LLM client using provided configuration.
     """
     try:
         load_dotenv('.env')
-        llm_client = GigaChat(credentials=os.environ.get("LLM_API_KEY"), verify_ssl_certs=False)
-        logger.info("LLM client initialized successfully.")
+        client_config = config["llm_client"]
+        if not client_config["resilient"]:
+            llm_client = GigaChat(credentials=os.environ.get("LLM_API_KEY"), verify_ssl_certs=False)
+            logger.info("LLM client initialized successfully.")
+            return llm_client
+
+        # A transport-level bound on every single read; the generation deadlines are enforced by the wrapper
+        llm_client = ResilientLLMClient(
+            GigaChat(credentials=os.environ.get("LLM_API_KEY"), verify_ssl_certs=False,
+                     timeout=client_config["read_timeout_seconds"]),
+            client_config,
+        )
+        logger.info(f"LLM client initialized successfully (max_concurrency={llm_client.max_concurrency}, "
+                    f"hedging={'on' if llm_client.hedging else 'off'}).")
         return llm_client
     except Exception as e:
         logger.error(f"Failed to initialize LLM client: {e}")
@@ -37,30 +52,79 @@ def build_prompt(contexts: list[str], query: str) -> str:
     return prompt
 
 
+def build_answer_chat(contexts: list[Context], query: str, config: dict) -> Chat:
+    """
+    Builds the chat payload that asks the LLM to answer the query from the given contexts.
+    """
+    # Chunked retrieval already keeps vector contexts short; full-text hits are still whole articles
+    contexts = [context.text[:config["llm"]["max_context_chars"]] for context in contexts]
+
+    prompt = build_prompt(contexts, query)
+    return Chat(
+        messages=[
+            Messages(role=MessagesRole.SYSTEM, content=config["llm"]["system_prompt"]),
+            Messages(role=MessagesRole.USER, content=prompt),
+        ],
+        temperature=config["llm"]["temperature"],
+        top_p=config["llm"]["top_p"],
+        max_tokens=config["llm"]["max_tokens"],
+    )
+
+
+def build_rewrite_chat(query: str, config: dict) -> Chat:
+    """
+    Builds the chat payload that asks the LLM_rewriter to expand the user's query.
+    """
+    return Chat(
+        messages=[
+            Messages(role=MessagesRole.SYSTEM, content=config["llm_rewriter"]["system_prompt"]),
+            Messages(role=MessagesRole.USER, content=f"Вопрос: {query}"),
+        ],
+        temperature=config["llm_rewriter"]["temperature"],
+        top_p=config["llm_rewriter"]["top_p"],
+        max_tokens=config["llm_rewriter"]["max_tokens"],
+    )
+
+
 def generate_response(llm_client: GigaChat, contexts: list[Context], query: str, config) -> str:
     """
     Generates a response based on retrieved contexts and the input query.
     """
     try:
-        contexts = [context.text[:2048] for context in contexts] # TODO add chunker
-
-        prompt = build_prompt(contexts, query)
-        response = llm_client.stream(
-            Chat(
-                messages=[
-                    Messages(role=MessagesRole.SYSTEM, content=config["llm"]["system_prompt"]),
-                    Messages(role=MessagesRole.USER, content=prompt),
-                ],
-                temperature=config["llm"]["temperature"],
-                top_p=config["llm"]["top_p"],
-                max_tokens=config["llm"]["max_tokens"],
-            )
-        )
-
         generated_response = ""
-        for chunk in response:
+        with track_llm_call("generate_response") as call:
+            for chunk in llm_client.stream(build_answer_chat(contexts, query, config)):
+                call.observe(chunk)
+                if chunk.choices[0].delta.content is not None:
+                    generated_response += chunk.choices[0].delta.content
+
+        logger.info(f"Generated response: {generated_response[:30]}...")
+        return generated_response
+    except Exception as e:
+        logger.error(f"Error generating response: {e}")
+        raise
+
+
+async def stream_response_async(llm_client: GigaChat, contexts: list[Context], query: str,
+                                config) -> AsyncIterator[str]:
+    """
+    Yields response deltas as soon as the LLM produces them.
+    """
+    with track_llm_call("generate_response") as call:
+        async for chunk in llm_client.astream(build_answer_chat(contexts, query, config)):
+            call.observe(chunk)
             if chunk.choices[0].delta.content is not None:
-                generated_response += chunk.choices[0].delta.content
+                yield chunk.choices[0].delta.content
+
+
+async def generate_response_async(llm_client: GigaChat, contexts: list[Context], query: str, config) -> str:
+    """
+    Async variant of generate_response: awaits the LLM stream without holding a worker thread.
+    """
+    try:
+        generated_response = ""
+        async for delta in stream_response_async(llm_client, contexts, query, config):
+            generated_response += delta
 
         logger.info(f"Generated response: {generated_response[:30]}...")
         return generated_response
@@ -74,22 +138,32 @@ def rewrite_query(llm_client: GigaChat, query: str, config: dict) -> str:
     Answers user's query using LLM_rewriter
     """
     try:
-        response = llm_client.stream(
-            Chat(
-                messages=[
-                    Messages(role=MessagesRole.SYSTEM, content=config["llm_rewriter"]["system_prompt"]),
-                    Messages(role=MessagesRole.USER, content=f"Вопрос: {query}"),
-                ],
-                temperature=config["llm_rewriter"]["temperature"],
-                top_p=config["llm_rewriter"]["top_p"],
-                max_tokens=config["llm_rewriter"]["max_tokens"],
-            )
-        )
+        rewrited_query = ""
+        with track_llm_call("rewrite_query") as call:
+            for chunk in llm_client.stream(build_rewrite_chat(query, config)):
+                call.observe(chunk)
+                if chunk.choices[0].delta.content is not None:
+                    rewrited_query += chunk.choices[0].delta.content
 
+        rewrited_query += f'\n------------------\n{query}'
+        logger.info(f"Rewrited query: {rewrited_query}")
+        return rewrited_query
+    except Exception as e:
+        logger.error(f"Error rewriting query: {e}")
+        raise
+
+
+async def rewrite_query_async(llm_client: GigaChat, query: str, config: dict) -> str:
+    """
+    Async variant of rewrite_query.
+    """
+    try:
         rewrited_query = ""
-        for chunk in response:
-            if chunk.choices[0].delta.content is not None:
-                rewrited_query += chunk.choices[0].delta.content
+        with track_llm_call("rewrite_query") as call:
+            async for chunk in llm_client.astream(build_rewrite_chat(query, config)):
+                call.observe(chunk)
+                if chunk.choices[0].delta.content is not None:
+                    rewrited_query += chunk.choices[0].delta.content
 
         rewrited_query += f'\n------------------\n{query}'
         logger.info(f"Rewrited query: {rewrited_query}")
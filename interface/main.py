@@ -1,17 +1,28 @@
+import asyncio
+import json
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 
 import yaml
-from opensearchpy import OpenSearch
-from fastapi import FastAPI
+from opensearchpy import AsyncOpenSearch
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
-from interface.schemas import QuestionResponse, QuestionCreate
+from interface.schemas import QuestionBatchCreate, QuestionResponse, QuestionCreate
 from interface.llm_client import initialize_llm_client
-from interface.retrieval import initialize_embedding_model
-from interface.process import process_request
+from interface.metrics import format_server_timing, stage, start_request_timings
+from interface.retrieval import initialize_embedding_model, warm_up_embedding_model
+from interface.process import (initialize_answer_cache, initialize_rewrite_cache, process_request_async,
+                               process_request_batch_async, stream_request_async)
 from interface import models_interface
 
-from utils.database import engine
+from utils.database import (database_pool_stats, dispose_async_engine, engine, ping_database, warm_up_database,
+                            warm_up_database_async)
+from utils.search_client import (connection_config, create_async_os_client, create_os_client, os_pool_stats,
+                                 warm_up_async_os_client, warm_up_os_client)
 
 
 # Load configuration
@@ -25,14 +36,14 @@ logger = logging.getLogger(config["project"]["name"])
 os_logger = logging.getLogger('opensearch')
 os_logger.setLevel(logging.WARNING)
 
-# Initialize the database
-models_interface.Base.metadata.create_all(bind=engine)
-
-# Initialize models and LLM client
-local_embedder = initialize_embedding_model(config)
-llm_client = initialize_llm_client()
-
-os_client = OpenSearch([{"host": config["os_params"]["host"], "port": config["os_params"]["port"]}])
+# Set up by the lifespan, before the first request is accepted
+local_embedder = None
+llm_client = None
+answer_cache = None
+rewrite_cache = None
+os_client = None
+encoding_executor = None
+readiness = {"embedding_model": False, "database": False, "opensearch": False}
 
 unexpected_format_response = "An error occurred while processing the request due to unexpected response format."
 unexpected_format_context = "No valid context available due to unexpected response format."
@@ -41,22 +52,134 @@ server_error_response = "An internal server error occurred. Please try again lat
 server_error_context = "No context available due to server error."
 
 
+async def startup_phase(name: str, awaitable):
+    start = time.perf_counter()
+    result = await awaitable
+    logger.info(f"Startup phase '{name}' took {time.perf_counter() - start:.2f}s")
+    return result
+
+
+def prepare_database() -> bool:
+    """
+    Creates missing tables and opens the warm-up connections. False if Postgres is not reachable.
+    """
+    if not ping_database():
+        return False
+    models_interface.Base.metadata.create_all(bind=engine)
+    warm_up_database()
+    return True
+
+
+async def prepare_database_async() -> bool:
+    reachable = await asyncio.to_thread(prepare_database)
+    if reachable and config["database"]["async_enabled"]:
+        await warm_up_database_async()
+    return reachable
+
+
+async def prepare_opensearch() -> bool:
+    # At least one ping, so an unreachable cluster is noticed even without connection warm-up
+    n_connections = max(connection_config(config["os_params"])["warm_up_connections"], 1)
+    if isinstance(os_client, AsyncOpenSearch):
+        return await warm_up_async_os_client(os_client, n_connections)
+    return await asyncio.to_thread(warm_up_os_client, os_client, n_connections)
+
+
+def log_readiness(start: float | None = None) -> None:
+    if all(readiness.values()):
+        started = f" in {time.perf_counter() - start:.2f}s" if start is not None else ""
+        logger.info(f"Ready to serve{started}")
+    else:
+        waiting = ", ".join(name for name, ready in readiness.items() if not ready)
+        logger.warning(f"Started without {waiting}, /readyz re-checks on every probe")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    global local_embedder, llm_client, answer_cache, rewrite_cache, os_client, encoding_executor
+    start = time.perf_counter()
+
+    llm_client = initialize_llm_client(config)
+    answer_cache = initialize_answer_cache(config)
+    rewrite_cache = initialize_rewrite_cache(config)
+    # The request handlers only take async paths, so they can use the aiohttp-based client throughout
+    if config["os_params"]["async_client"]:
+        os_client = create_async_os_client(config["os_params"])
+    else:
+        os_client = create_os_client(config["os_params"])
+    # CPU-bound query encoding gets its own threads so it never starves the event loop's default pool
+    encoding_executor = ThreadPoolExecutor(max_workers=config["server"]["encoding_workers"],
+                                           thread_name_prefix="encoder")
+
+    # The model loads on the encoding threads while the connections to Postgres and OpenSearch are opened
+    loop = asyncio.get_running_loop()
+    local_embedder, readiness["database"], readiness["opensearch"] = await asyncio.gather(
+        startup_phase("embedding model", loop.run_in_executor(encoding_executor, initialize_embedding_model,
+                                                              config)),
+        startup_phase("database", prepare_database_async()),
+        startup_phase("opensearch", prepare_opensearch()),
+    )
+    await startup_phase("model warm-up", loop.run_in_executor(encoding_executor, warm_up_embedding_model,
+                                                              local_embedder, config))
+    readiness["embedding_model"] = True
+    log_readiness(start)
+
     yield
     logger.info("App shutting down")
+    if isinstance(os_client, AsyncOpenSearch):
+        await os_client.close()
+    await dispose_async_engine()
+    encoding_executor.shutdown(wait=False, cancel_futures=True)
+    close_embedder = getattr(local_embedder, "close", None)  # the micro-batching worker, if enabled
+    if close_embedder is not None:
+        close_embedder()
 
 
 app = FastAPI(title=config["project"]["name"], lifespan=lifespan)
 
 
+@app.get("/healthz")
+def healthz():
+    """
+    Liveness: the process is up and its event loop responds.
+    """
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz(response: Response):
+    """
+    Readiness: the model is loaded and warm and Postgres and OpenSearch answered.
+    Dependencies that were down at startup are pinged again on each call.
+    """
+    if all(readiness.values()):
+        return {"status": "ready", "checks": readiness}
+
+    if not readiness["database"]:
+        readiness["database"] = await prepare_database_async()
+    if not readiness["opensearch"]:
+        readiness["opensearch"] = await prepare_opensearch()
+    if all(readiness.values()):
+        log_readiness()
+        return {"status": "ready", "checks": readiness}
+
+    response.status_code = 503
+    return {"status": "not ready", "checks": readiness}
+
+
 @app.post("/ask/", response_model=QuestionResponse)
-def ask_question(question: QuestionCreate):
+async def ask_question(question: QuestionCreate, response: Response):
     logger.info(f"Received question: {question.question}")
+    timings = start_request_timings()
 
     try:
-        response_content = process_request(config, local_embedder, llm_client, question.question, os_client)
+        with stage("request"):
+            response_content = await process_request_async(config, local_embedder, llm_client, question.question,
+                                                           os_client, encoding_executor, answer_cache,
+                                                           rewrite_cache)
         logger.info(f"LLM Response: {response_content}")
+        if config["metrics"]["timing_header"]:
+            response.headers["Server-Timing"] = format_server_timing(timings)
 
         if isinstance(response_content, dict) and 'response' in response_content and 'context' in response_content:
             return QuestionResponse(
@@ -80,6 +203,108 @@ def ask_question(question: QuestionCreate):
         )
 
 
+def format_ndjson(data) -> str:
+    return json.dumps(data, ensure_ascii=False) + "\n"
+
+
+@app.post("/ask/batch")
+async def ask_questions_batch(batch: QuestionBatchCreate, response: Response):
+    """
+    Newline-delimited JSON: one {"index": ..., "response": ..., "contexts": ...} line per question,
+    in the order the answers complete; index is the question's position in the request.
+    """
+    max_questions = config["batch"]["max_questions"]
+    if len(batch.questions) > max_questions:
+        response.status_code = 413
+        return {"detail": f"At most {max_questions} questions per batch"}
+    logger.info(f"Received a batch of {len(batch.questions)} questions")
+
+    async def answers():
+        answered = set()
+        try:
+            async for position, result in process_request_batch_async(config, local_embedder, llm_client,
+                                                                       batch.questions, os_client, encoding_executor,
+                                                                       answer_cache, rewrite_cache):
+                answered.add(position)
+                if isinstance(result, dict):
+                    answer = QuestionResponse(response=result["response"], contexts=result["context"])
+                else:
+                    answer = QuestionResponse(response=result, contexts=server_error_context)
+                yield format_ndjson({"index": position, **answer.model_dump(mode="json")})
+        except Exception as e:
+            logger.exception(f"An error occurred while answering the batch: {str(e)}")
+            for position in range(len(batch.questions)):
+                if position not in answered:
+                    answer = QuestionResponse(response=server_error_response, contexts=server_error_context)
+                    yield format_ndjson({"index": position, **answer.model_dump(mode="json")})
+
+    return StreamingResponse(answers(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
+
+@app.get("/metrics")
+def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/pool/stats")
+def connection_pool_stats():
+    stats = database_pool_stats()
+    stats["opensearch"] = os_pool_stats(os_client)
+    return stats
+
+
+@app.get("/llm/stats")
+def llm_client_stats():
+    stats = getattr(llm_client, "stats", None)
+    return stats() if stats is not None else {}
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    stats = {}
+    if answer_cache is not None:
+        stats["answer_cache"] = answer_cache.stats()
+    if hasattr(local_embedder, "cache"):
+        stats["query_embedding_cache"] = local_embedder.cache.stats()
+    return stats
+
+
+def format_sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/ask/stream")
+async def ask_question_stream(question: QuestionCreate):
+    """
+    Server-sent events: a leading "context" event, then "delta" events as the LLM produces them,
+    terminated by "done" (or "error").
+    """
+    logger.info(f"Received question for streaming: {question.question}")
+
+    async def events():
+        timings = start_request_timings()
+        try:
+            async for event, payload in stream_request_async(config, local_embedder, llm_client, question.question,
+                                                             os_client, encoding_executor, answer_cache,
+                                                             rewrite_cache):
+                if event == "context":
+                    yield format_sse(event, [context.model_dump(mode="json") for context in payload])
+                elif event == "delta":
+                    yield format_sse(event, {"text": payload})
+                else:
+                    logger.info(f"LLM Response: {payload}")
+                    done = {"response": payload}
+                    if config["metrics"]["timing_header"]:
+                        done["timings_ms"] = {name: round(seconds * 1000, 1) for name, seconds in timings.items()}
+                    yield format_sse(event, done)
+        except Exception as e:
+            logger.exception(f"An error occurred while streaming the answer: {str(e)}")
+            yield format_sse("error", {"response": server_error_response})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -0,0 +1,126 @@
+"""
+Prometheus metrics of the request pipeline, served on /metrics, and the per-request stage breakdown
+that /ask can return in a Server-Timing header.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+from prometheus_client import Counter, Histogram
+
+STAGE_SECONDS = Histogram(
+    "faplrag_stage_seconds", "Duration of a request pipeline stage", ["stage"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+LLM_TIME_TO_FIRST_TOKEN = Histogram(
+    "faplrag_llm_time_to_first_token_seconds", "Time from sending an LLM request to its first content chunk",
+    ["call"], buckets=(0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0),
+)
+LLM_TOKENS = Histogram(
+    "faplrag_llm_tokens", "Prompt and completion tokens of an LLM call, as reported by the API", ["call", "kind"],
+    buckets=(16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192),
+)
+RETRIEVAL_HITS = Histogram(
+    "faplrag_retrieval_hits", "Contexts returned by a retriever for one query", ["source"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50),
+)
+CONTEXT_COMPRESSION_RATIO = Histogram(
+    "faplrag_context_compression_ratio", "Share of context tokens kept by extractive compression",
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.8, 1.0),
+)
+LLM_CLIENT_EVENTS = Counter(
+    "faplrag_llm_client_events", "Retries, hedges, timeouts and rejections of the resilient LLM client", ["event"],
+)
+CACHE_REQUESTS = Counter("faplrag_cache_requests", "Cache lookups by cache and outcome", ["cache", "result"])
+
+_request_timings: ContextVar[dict[str, float] | None] = ContextVar("request_timings", default=None)
+
+
+def start_request_timings() -> dict[str, float]:
+    """
+    Starts collecting stage durations (in seconds) for the current request; tasks and threads spawned
+    from here on share the returned dict.
+    """
+    timings: dict[str, float] = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def record_stage(name: str, seconds: float) -> None:
+    STAGE_SECONDS.labels(name).observe(seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        # A stage can run more than once per request (e.g. speculative and final retrieval)
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def record_hits(source: str, n_hits: int) -> None:
+    RETRIEVAL_HITS.labels(source).observe(n_hits)
+
+
+def record_compression(ratio: float) -> None:
+    CONTEXT_COMPRESSION_RATIO.observe(ratio)
+
+
+def record_llm_client_event(event: str) -> None:
+    LLM_CLIENT_EVENTS.labels(event).inc()
+
+
+def record_cache_lookup(cache: str, hits: int, misses: int) -> None:
+    if hits:
+        CACHE_REQUESTS.labels(cache, "hit").inc(hits)
+    if misses:
+        CACHE_REQUESTS.labels(cache, "miss").inc(misses)
+
+
+class LLMCallMetrics:
+    """
+    Follows one streamed LLM call: feed it every chunk, it records the time to the first content chunk
+    and the token usage the API attaches to the stream.
+    """
+
+    def __init__(self, call: str):
+        self.call = call
+        self.start = time.perf_counter()
+        self.time_to_first_token: float | None = None
+        self.usage = None
+
+    def observe(self, chunk) -> None:
+        if self.time_to_first_token is None and chunk.choices and chunk.choices[0].delta.content:
+            self.time_to_first_token = time.perf_counter() - self.start
+            LLM_TIME_TO_FIRST_TOKEN.labels(self.call).observe(self.time_to_first_token)
+            timings = _request_timings.get()
+            if timings is not None:
+                timings[f"{self.call}_ttft"] = self.time_to_first_token
+        usage = getattr(chunk, "usage", None)
+        if usage is not None:
+            self.usage = usage
+
+    def finish(self) -> None:
+        record_stage(self.call, time.perf_counter() - self.start)
+        if self.usage is not None:
+            LLM_TOKENS.labels(self.call, "prompt").observe(self.usage.prompt_tokens)
+            LLM_TOKENS.labels(self.call, "completion").observe(self.usage.completion_tokens)
+
+
+@contextmanager
+def track_llm_call(call: str) -> Iterator[LLMCallMetrics]:
+    metrics = LLMCallMetrics(call)
+    try:
+        yield metrics
+    finally:
+        metrics.finish()
+
+
+def format_server_timing(timings: dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
@@ -1,5 +1,5 @@
 from pgvector.sqlalchemy import Vector
-from sqlalchemy import Column, Date, Integer, String, Text, ARRAY
+from sqlalchemy import Column, Date, DateTime, ForeignKey, Integer, String, Text, ARRAY, func
 
 from utils.database import Base
 from utils.config import EMBEDDING_DIMENSION
@@ -16,3 +16,16 @@ class Post(Base):
     n_visits = Column(Integer)
     vector = Column(Vector(EMBEDDING_DIMENSION))
     author = Column(String)
+    content_hash = Column(String(64))
+    # Set on every write by the loader, the semantic answer cache derives its data version from it
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+
+class PostChunk(Base):
+    __tablename__ = "post_chunks"
+
+    id = Column(Integer, primary_key=True)
+    post_uid = Column(Integer, ForeignKey("posts.uid", ondelete="CASCADE"), nullable=False, index=True)
+    chunk_index = Column(Integer, nullable=False)
+    text_content = Column(Text, nullable=False)
+    vector = Column(Vector(EMBEDDING_DIMENSION))
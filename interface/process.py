@@ -1,26 +1,248 @@
+import asyncio
 import logging
+import time
+from concurrent.futures import Executor
+from typing import Any, AsyncIterator
+
 from opensearchpy import OpenSearch
 from gigachat import GigaChat
 
+from interface.cache import InMemorySemanticCache, SemanticCache, TTLCache
+from interface.compression import compress_contexts, compress_contexts_async
 from interface.schemas import Context
 from interface.embedder import Embedder
-from interface.retrieval import retrieve_contexts
-from interface.llm_client import generate_response, rewrite_query
+from interface.metrics import record_cache_lookup
+from interface.retrieval import (encode_queries_async, encode_query, encode_query_async, get_data_version,
+                                 retrieve_contexts, retrieve_contexts_async, retrieve_contexts_batch_async)
+from interface.llm_client import (generate_response, generate_response_async, rewrite_query, rewrite_query_async,
+                                  stream_response_async)
 
 
 logger = logging.getLogger(__name__)
 
+ANSWER_CACHE_BACKENDS: dict[str, type[SemanticCache]] = {
+    "memory": InMemorySemanticCache,
+}
+
+# The event loop only keeps weak references to tasks, rewrites left to finish after a request are held here
+_background_tasks: set[asyncio.Task] = set()
+
+
+def initialize_answer_cache(config: dict) -> SemanticCache | None:
+    """
+    Builds the semantic answer cache from the "answer_cache" config section, if it is enabled.
+    """
+    cache_config = config.get("answer_cache", {})
+    if not cache_config.get("enabled", False):
+        return None
+
+    backend = ANSWER_CACHE_BACKENDS[cache_config["backend"]]
+    answer_cache = backend(
+        max_size=cache_config["max_size"],
+        similarity_threshold=cache_config["similarity_threshold"],
+        ttl_seconds=cache_config["ttl_seconds"],
+        data_version_fn=get_data_version,
+        version_check_seconds=cache_config["version_check_seconds"],
+    )
+    logger.info(f"Initialized '{cache_config['backend']}' semantic answer cache")
+    return answer_cache
+
+
+def initialize_rewrite_cache(config: dict) -> TTLCache | None:
+    """
+    Builds the memo of rewritten queries from the "speculative_retrieval" config section.
+    """
+    speculative_config = config.get("speculative_retrieval", {})
+    if not speculative_config.get("rewrite_cache_size"):
+        return None
+    return TTLCache(max_size=speculative_config["rewrite_cache_size"],
+                    ttl_seconds=speculative_config["rewrite_cache_ttl_seconds"])
+
+
+def lookup_rewrite(rewrite_cache: TTLCache | None, query: str) -> str | None:
+    """
+    The memoized rewrite of the query, if any. The only place the memo is read, so that every
+    request counts once in its hit/miss statistics.
+    """
+    if rewrite_cache is None:
+        return None
+    rewrited_query = rewrite_cache.get(" ".join(query.split()))
+    record_cache_lookup("rewrite", hits=int(rewrited_query is not None), misses=int(rewrited_query is None))
+    return rewrited_query
+
+
+async def rewrite_and_memoize_async(llm_client: GigaChat, query: str, config: dict,
+                                    rewrite_cache: TTLCache | None = None) -> str:
+    rewrited_query = await rewrite_query_async(llm_client, query, config)
+    if rewrite_cache is not None:
+        rewrite_cache.set(" ".join(query.split()), rewrited_query)
+    return rewrited_query
+
+
+async def rewrite_query_memoized_async(llm_client: GigaChat, query: str, config: dict,
+                                       rewrite_cache: TTLCache | None = None) -> str:
+    rewrited_query = lookup_rewrite(rewrite_cache, query)
+    if rewrited_query is not None:
+        return rewrited_query
+    return await rewrite_and_memoize_async(llm_client, query, config, rewrite_cache)
+
+
+async def rewrite_and_retrieve_async(config: dict, embedder: Embedder, llm_client: GigaChat, query: str,
+                                     os_client: OpenSearch, executor: Executor | None = None,
+                                     rewrite_cache: TTLCache | None = None,
+                                     request_start: float | None = None) -> list[Context]:
+    """
+    Rewrites the query and retrieves contexts for it.
 
-def process_request(config: dict, embedder: Embedder, llm_client: GigaChat, query: str, os_client: OpenSearch) -> dict | str:
+    In speculative mode retrieval on the raw query starts together with the rewrite. If the rewrite
+    is not ready within rewrite_budget_ms of the request start (time.perf_counter() at request_start,
+    by default the call), the speculative contexts are used and the rewrite is left to finish in the
+    background so that the memo serves the next request.
+    """
+    speculative_config = config.get("speculative_retrieval", {})
+    start = request_start if request_start is not None else time.perf_counter()
+    timings = {}
+
+    def elapsed_ms() -> float:
+        return round((time.perf_counter() - start) * 1000, 1)
+
+    memoized = lookup_rewrite(rewrite_cache, query)
+    if memoized is not None or not speculative_config.get("enabled", False):
+        rewrited_query = memoized or await rewrite_and_memoize_async(llm_client, query, config, rewrite_cache)
+        timings["rewrite_ms"] = elapsed_ms()
+        contexts = await retrieve_contexts_async(rewrited_query, embedder, config, os_client, executor)
+        timings["retrieval_ms"] = elapsed_ms()
+        logger.info(f"Stage timings ({'memoized' if memoized else 'sequential'} rewrite): {timings}")
+        return contexts
+
+    rewrite_task = asyncio.create_task(rewrite_and_memoize_async(llm_client, query, config, rewrite_cache))
+    _background_tasks.add(rewrite_task)
+    rewrite_task.add_done_callback(_background_tasks.discard)
+    speculative_task = asyncio.create_task(retrieve_contexts_async(query, embedder, config, os_client, executor))
+
+    def record(stage: str):
+        def callback(task: asyncio.Task) -> None:
+            if task.cancelled():
+                return
+            timings.setdefault(stage, elapsed_ms())
+            if task.exception() is not None:
+                logger.debug(f"Stage {stage} failed: {task.exception()}")
+        return callback
+
+    rewrite_task.add_done_callback(record("rewrite_ms"))
+    speculative_task.add_done_callback(record("speculative_retrieval_ms"))
+
+    budget = speculative_config["rewrite_budget_ms"] / 1000
+    await asyncio.wait({rewrite_task}, timeout=max(budget - (time.perf_counter() - start), 0))
+
+    if rewrite_task.done() and rewrite_task.exception() is None:
+        speculative_task.cancel()
+        contexts = await retrieve_contexts_async(rewrite_task.result(), embedder, config, os_client, executor)
+        timings["retrieval_ms"] = elapsed_ms()
+        logger.info(f"Stage timings (rewrite within budget): {timings}")
+        return contexts
+
+    if rewrite_task.done():
+        logger.warning(f"Query rewrite failed, using speculative contexts: {rewrite_task.exception()}")
+    contexts = await speculative_task
+    logger.info(f"Stage timings (speculative contexts used): {timings}")
+    return contexts
+
+
+def process_request(config: dict, embedder: Embedder, llm_client: GigaChat, query: str, os_client: OpenSearch,
+                    answer_cache: SemanticCache | None = None) -> dict | str:
     """
     Processes the incoming query by retrieving relevant contexts and generating a response.
     """
     try:
+        if answer_cache is not None:
+            query_vector = encode_query(query, embedder)
+            cached = answer_cache.lookup(query_vector)
+            data_version = answer_cache.data_version  # read before retrieval, see SemanticCache.store
+            record_cache_lookup("answer", hits=int(cached is not None), misses=int(cached is None))
+            if cached is not None:
+                return {"response": cached.answer, "context": cached.contexts}
+
         rewrited_query = rewrite_query(llm_client, query, config)
         contexts: list[Context] = retrieve_contexts(rewrited_query, embedder, config, os_client)
 
         # Generate the response
-        llm_response = generate_response(llm_client, contexts, query, config)
+        prompt_contexts = contexts
+        if config["context_compression"]["enabled"]:
+            prompt_contexts = compress_contexts(contexts, query, embedder, config,
+                                                query_vector if answer_cache is not None else None)
+        llm_response = generate_response(llm_client, prompt_contexts, query, config)
+
+        if answer_cache is not None:
+            answer_cache.store(query_vector, llm_response, contexts, data_version)
+
+        # Return both the response and the contexts used
+        return {"response": llm_response, "context": contexts}
+
+    except Exception as e:
+        logger.error(f"Failed to process request: {e}")
+        return (
+            "An error occurred while processing your request. Please try again later."
+        )
+
+
+def process_request_batch(config: dict, embedder: Embedder, llm_client: GigaChat, queries: list[str],
+                          os_client: OpenSearch, answer_cache: SemanticCache | None = None) -> list[dict | str]:
+    """
+    Batch variant of process_request: answers all queries with one encoder pass, one vector search query
+    and one OpenSearch _msearch (see process_request_batch_async). Results come back in the order of queries.
+    """
+    async def collect() -> list[dict | str]:
+        results: list[dict | str] = [""] * len(queries)
+        async for position, result in process_request_batch_async(config, embedder, llm_client, queries, os_client,
+                                                                  answer_cache=answer_cache):
+            results[position] = result
+        return results
+
+    return asyncio.run(collect())
+
+
+async def lookup_answer_async(answer_cache: SemanticCache, embedder: Embedder, query: str,
+                              executor: Executor | None = None):
+    """
+    Encodes the raw question and looks it up in the semantic answer cache.
+    Returns the question vector and the cache's data version (to store the answer under later)
+    and the cached entry, if any.
+    """
+    query_vector = await encode_query_async(query, embedder, executor)
+    cached = await asyncio.to_thread(answer_cache.lookup, query_vector)
+    record_cache_lookup("answer", hits=int(cached is not None), misses=int(cached is None))
+    return query_vector, answer_cache.data_version, cached
+
+
+async def process_request_async(config: dict, embedder: Embedder, llm_client: GigaChat, query: str,
+                                os_client: OpenSearch, executor: Executor | None = None,
+                                answer_cache: SemanticCache | None = None,
+                                rewrite_cache: TTLCache | None = None) -> dict | str:
+    """
+    Async variant of process_request. LLM streams are awaited on the event loop and query
+    encoding runs on the given executor, so one worker can serve many requests at once.
+    """
+    start = time.perf_counter()
+    try:
+        if answer_cache is not None:
+            query_vector, data_version, cached = await lookup_answer_async(answer_cache, embedder, query,
+                                                                           executor)
+            if cached is not None:
+                return {"response": cached.answer, "context": cached.contexts}
+
+        contexts: list[Context] = await rewrite_and_retrieve_async(config, embedder, llm_client, query, os_client,
+                                                                   executor, rewrite_cache, start)
+
+        # Generate the response
+        prompt_contexts = contexts
+        if config["context_compression"]["enabled"]:
+            prompt_contexts = await compress_contexts_async(contexts, query, embedder, config, executor,
+                                                            query_vector if answer_cache is not None else None)
+        llm_response = await generate_response_async(llm_client, prompt_contexts, query, config)
+
+        if answer_cache is not None:
+            answer_cache.store(query_vector, llm_response, contexts, data_version)
 
         # Return both the response and the contexts used
         return {"response": llm_response, "context": contexts}
@@ -30,3 +252,122 @@ def process_request(config: dict, embedder: Embedder, llm_client: GigaChat, quer
         return (
             "An error occurred while processing your request. Please try again later."
         )
+
+
+async def stream_request_async(config: dict, embedder: Embedder, llm_client: GigaChat, query: str,
+                               os_client: OpenSearch, executor: Executor | None = None,
+                               answer_cache: SemanticCache | None = None,
+                               rewrite_cache: TTLCache | None = None) -> AsyncIterator[tuple[str, Any]]:
+    """
+    Streams the answer as (event, payload) pairs: one "context" event with the retrieved contexts,
+    then a "delta" event per LLM chunk and a final "done" event with the full response.
+    """
+    start = time.perf_counter()
+    if answer_cache is not None:
+        query_vector, data_version, cached = await lookup_answer_async(answer_cache, embedder, query, executor)
+        if cached is not None:
+            yield "context", cached.contexts
+            yield "delta", cached.answer
+            yield "done", cached.answer
+            return
+
+    contexts: list[Context] = await rewrite_and_retrieve_async(config, embedder, llm_client, query, os_client,
+                                                               executor, rewrite_cache, start)
+    yield "context", contexts
+
+    prompt_contexts = contexts
+    if config["context_compression"]["enabled"]:
+        prompt_contexts = await compress_contexts_async(contexts, query, embedder, config, executor,
+                                                        query_vector if answer_cache is not None else None)
+
+    generated_response = ""
+    async for delta in stream_response_async(llm_client, prompt_contexts, query, config):
+        generated_response += delta
+        yield "delta", delta
+
+    logger.info(f"Generated response: {generated_response[:30]}...")
+    if answer_cache is not None:
+        answer_cache.store(query_vector, generated_response, contexts, data_version)
+    yield "done", generated_response
+
+
+async def process_request_batch_async(config: dict, embedder: Embedder, llm_client: GigaChat, queries: list[str],
+                                      os_client: OpenSearch, executor: Executor | None = None,
+                                      answer_cache: SemanticCache | None = None,
+                                      rewrite_cache: TTLCache | None = None) -> AsyncIterator[tuple[int, dict | str]]:
+    """
+    Answers a batch of queries and yields (position, result) pairs as soon as each answer is ready;
+    results have the same shape as process_request's, so a failed query does not fail the batch.
+
+    The per-query round trips of process_request_async are shared by the whole batch: the questions
+    are encoded in one call for the answer cache, and the rewritten queries in one call for retrieval,
+    which takes a single vector search query and a single _msearch. Rewrites and generations run at
+    most batch.max_parallel_llm at a time. Speculative retrieval does not apply here, the batch
+    retrieval waits for all rewrites.
+    """
+    error_response = "An error occurred while processing your request. Please try again later."
+    llm_slots = asyncio.Semaphore(config["batch"]["max_parallel_llm"])
+    pending = list(range(len(queries)))
+    query_vectors: list[list[float]] | None = None
+
+    try:
+        if answer_cache is not None and queries:
+            query_vectors = await encode_queries_async(queries, embedder, executor)
+            cached = await asyncio.to_thread(lambda: [answer_cache.lookup(vector) for vector in query_vectors])
+            data_version = answer_cache.data_version
+            record_cache_lookup("answer", hits=sum(entry is not None for entry in cached),
+                                misses=sum(entry is None for entry in cached))
+            for position, entry in enumerate(cached):
+                if entry is not None:
+                    yield position, {"response": entry.answer, "context": entry.contexts}
+            pending = [position for position, entry in enumerate(cached) if entry is None]
+
+        async def rewrite(position: int) -> str | None:
+            async with llm_slots:
+                try:
+                    return await rewrite_query_memoized_async(llm_client, queries[position], config, rewrite_cache)
+                except Exception as e:
+                    logger.error(f"Failed to rewrite query {position} of the batch: {e}")
+                    return None
+
+        rewrited_queries = await asyncio.gather(*(rewrite(position) for position in pending))
+        for position, rewrited_query in zip(pending, rewrited_queries):
+            if rewrited_query is None:
+                yield position, error_response
+        rewritten = [(position, rewrited_query) for position, rewrited_query in zip(pending, rewrited_queries)
+                     if rewrited_query is not None]
+        pending = [position for position, _ in rewritten]
+
+        batch_contexts = await retrieve_contexts_batch_async([rewrited_query for _, rewrited_query in rewritten],
+                                                             embedder, config, os_client, executor)
+    except Exception as e:
+        logger.error(f"Failed to process a batch of {len(queries)} requests: {e}")
+        for position in pending:
+            yield position, error_response
+        return
+
+    async def answer(position: int, contexts: list[Context]) -> tuple[int, dict | str]:
+        query = queries[position]
+        query_vector = query_vectors[position] if query_vectors is not None else None
+        try:
+            prompt_contexts = contexts
+            if config["context_compression"]["enabled"]:
+                prompt_contexts = await compress_contexts_async(contexts, query, embedder, config, executor,
+                                                                query_vector)
+            async with llm_slots:
+                llm_response = await generate_response_async(llm_client, prompt_contexts, query, config)
+            if answer_cache is not None:
+                answer_cache.store(query_vector, llm_response, contexts, data_version)
+            return position, {"response": llm_response, "context": contexts}
+        except Exception as e:
+            logger.error(f"Failed to answer query {position} of the batch: {e}")
+            return position, error_response
+
+    tasks = [asyncio.create_task(answer(position, contexts)) for position, contexts in zip(pending, batch_contexts)]
+    try:
+        for next_answer in asyncio.as_completed(tasks):
+            yield await next_answer
+    finally:
+        # The client went away mid-batch: no point in generating the remaining answers
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,379 @@
+import asyncio
+import logging
+import queue
+import random
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Iterable, Iterator
+
+import httpx
+import numpy as np
+from gigachat import GigaChat
+from gigachat.exceptions import ResponseError
+
+from interface.metrics import record_llm_client_event
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class LLMUnavailableError(RuntimeError):
+    """
+    The circuit breaker is open or no concurrency slot freed up within the queue timeout.
+    """
+
+
+class LLMTimeoutError(TimeoutError):
+    """
+    The first token or the whole generation missed its deadline.
+    """
+
+
+def status_code_of(error: ResponseError) -> int | None:
+    status_code = getattr(error, "status_code", None)
+    if status_code is None and len(error.args) > 1:
+        status_code = error.args[1]  # older gigachat releases only pass it positionally
+    return status_code
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, httpx.TransportError)):
+        return True
+    if isinstance(error, ResponseError):
+        return status_code_of(error) in RETRYABLE_STATUS_CODES
+    return False
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive retryable failures and rejects calls for reset_timeout_seconds.
+    After that a single trial call goes through; its success closes the breaker, anything else keeps it open
+    for another period.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout_seconds: float, timer=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout_seconds
+        self.timer = timer
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "open" if self.timer() - self.opened_at < self.reset_timeout else "half-open"
+
+    def acquire(self) -> None:
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if self.timer() - self.opened_at < self.reset_timeout:
+                record_llm_client_event("rejected")
+                raise LLMUnavailableError(f"LLM circuit breaker is open after {self.failures} failures")
+            # Half-open: re-arm the timer so that only this call probes the provider
+            self.opened_at = self.timer()
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info("LLM circuit breaker closed")
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.opened_at is None and self.failures >= self.failure_threshold:
+                logger.warning(f"LLM circuit breaker opened after {self.failures} consecutive failures")
+                record_llm_client_event("breaker_opened")
+                self.opened_at = self.timer()
+            elif self.opened_at is not None:
+                self.opened_at = self.timer()
+
+
+class ThreadedStream:
+    """
+    Reads a blocking stream on a daemon thread, so that the caller can wait for every chunk with a deadline.
+    After close() the reader drops the rest of the stream as soon as its current read returns.
+    """
+
+    END = object()
+
+    def __init__(self, open_stream: Callable[[], Iterable]):
+        self._chunks: queue.Queue = queue.Queue()
+        self._closed = threading.Event()
+        threading.Thread(target=self._read, args=(open_stream,), name="llm-stream", daemon=True).start()
+
+    def _read(self, open_stream: Callable[[], Iterable]) -> None:
+        iterator = None
+        try:
+            iterator = iter(open_stream())
+            for chunk in iterator:
+                if self._closed.is_set():
+                    return
+                self._chunks.put((chunk, None))
+            self._chunks.put((self.END, None))
+        except Exception as e:
+            self._chunks.put((None, e))
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    def next(self, timeout: float):
+        """
+        Returns the next chunk or ThreadedStream.END, re-raises the stream's error and raises queue.Empty
+        if nothing arrived within timeout seconds.
+        """
+        chunk, error = self._chunks.get(timeout=max(timeout, 0))
+        if error is not None:
+            raise error
+        return chunk
+
+    def close(self) -> None:
+        self._closed.set()
+
+
+class ResilientLLMClient:
+    """
+    Wraps GigaChat's stream/astream, so llm_client uses it like the bare client, with:
+    - at most max_concurrency upstream streams (separately for the sync and the async path), callers
+      wait up to queue_timeout_seconds for a slot
+    - a first-token deadline and a total deadline per generation
+    - retries with full-jitter exponential backoff, only while nothing has been yielded yet
+    - a circuit breaker over retryable failures
+    - optional hedging (async path): once the last `window` first-token times are known, a second request
+      is sent when the first token is later than their configured percentile; the stream that answers
+      first wins
+
+    The sync path reads the blocking stream on a separate thread (ThreadedStream) to enforce the deadlines;
+    a stream given up on keeps its thread until the pending read returns or hits the GigaChat client's
+    read timeout.
+    """
+
+    def __init__(self, client: GigaChat, config: dict):
+        self.client = client
+        self.max_concurrency = config["max_concurrency"]
+        self.queue_timeout = config["queue_timeout_seconds"]
+        self.first_token_timeout = config["first_token_timeout_seconds"]
+        self.total_timeout = config["total_timeout_seconds"]
+        self.max_retries = config["max_retries"]
+        self.backoff_base = config["backoff_base_seconds"]
+        self.backoff_max = config["backoff_max_seconds"]
+        self.breaker = CircuitBreaker(config["circuit_breaker"]["failure_threshold"],
+                                      config["circuit_breaker"]["reset_timeout_seconds"])
+
+        hedging_config = config["hedging"]
+        self.hedging = hedging_config["enabled"]
+        self.hedge_percentile = hedging_config["percentile"]
+        self.first_token_times: deque[float] = deque(maxlen=hedging_config["window"])
+        self._first_token_lock = threading.Lock()  # sync streams record from their callers' threads
+
+        self._sync_slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._async_slots: tuple[asyncio.AbstractEventLoop, asyncio.Semaphore] | None = None
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def backoff(self, attempt: int, error: BaseException) -> float:
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        # RateLimitError carries the provider's Retry-After
+        return max(delay, getattr(error, "retry_after", 0.0) or 0.0)
+
+    def record_first_token(self, seconds: float) -> None:
+        with self._first_token_lock:
+            self.first_token_times.append(seconds)
+
+    def hedge_delay(self) -> float | None:
+        """
+        The configured percentile of the recent first-token times, None until the window is full.
+        """
+        with self._first_token_lock:
+            if not self.hedging or len(self.first_token_times) < self.first_token_times.maxlen:
+                return None
+            first_token_times = list(self.first_token_times)
+        return float(np.percentile(first_token_times, self.hedge_percentile))
+
+    def retry_or_raise(self, attempt: int, error: Exception) -> float:
+        """
+        Counts the failure and returns the backoff before the next attempt, or re-raises the error.
+        """
+        if not is_retryable(error):
+            raise error
+        self.breaker.record_failure()
+        if attempt == self.max_retries:
+            raise error
+        record_llm_client_event("retry")
+        delay = self.backoff(attempt, error)
+        # ResponseError's str() carries the whole body and headers
+        reason = f"HTTP {status_code_of(error)}" if isinstance(error, ResponseError) else str(error)
+        logger.warning(f"LLM request failed ({type(error).__name__}: {reason}), retry {attempt + 1} in {delay:.2f}s")
+        return delay
+
+    @staticmethod
+    def next_chunk(reader: ThreadedStream, deadline: float, message: str):
+        try:
+            return reader.next(deadline - time.monotonic())
+        except queue.Empty:
+            record_llm_client_event("timeout")
+            raise LLMTimeoutError(message) from None
+
+    def stream(self, chat) -> Iterator:
+        if not self._sync_slots.acquire(timeout=self.queue_timeout):
+            record_llm_client_event("rejected")
+            raise LLMUnavailableError(f"No LLM slot freed up within {self.queue_timeout}s")
+        try:
+            for attempt in range(self.max_retries + 1):
+                self.breaker.acquire()
+                start = time.monotonic()
+                reader = ThreadedStream(lambda: self.client.stream(chat))
+                try:
+                    chunk = self.next_chunk(reader, start + self.first_token_timeout,
+                                            f"No LLM token within {self.first_token_timeout}s")
+                    break
+                except Exception as e:
+                    reader.close()
+                    time.sleep(self.retry_or_raise(attempt, e))
+            self.record_first_token(time.monotonic() - start)
+
+            deadline = start + self.total_timeout
+            try:
+                while chunk is not ThreadedStream.END:
+                    yield chunk
+                    chunk = self.next_chunk(reader, deadline,
+                                            f"LLM generation took longer than {self.total_timeout}s")
+            except Exception as e:
+                if is_retryable(e):
+                    self.breaker.record_failure()
+                raise
+            else:
+                self.breaker.record_success()
+            finally:
+                reader.close()
+        finally:
+            self._sync_slots.release()
+
+    def _get_async_slots(self) -> asyncio.Semaphore:
+        # asyncio primitives belong to one event loop; benchmarks and tests start a new one per run
+        loop = asyncio.get_running_loop()
+        if self._async_slots is None or self._async_slots[0] is not loop:
+            self._async_slots = (loop, asyncio.Semaphore(self.max_concurrency))
+        return self._async_slots[1]
+
+    async def _open_async(self, chat) -> tuple[AsyncIterator, object]:
+        iterator = self.client.astream(chat).__aiter__()
+        try:
+            return iterator, await iterator.__anext__()
+        except StopAsyncIteration:
+            return iterator, None
+
+    async def _first_chunk_async(self, chat, slots: asyncio.Semaphore, start: float) -> tuple[AsyncIterator, object]:
+        """
+        Opens the stream and waits for its first chunk until the first-token deadline, hedging once if it is late.
+        """
+        deadline = start + self.first_token_timeout
+        hedge_at = self.hedge_delay()
+        if hedge_at is not None:
+            hedge_at += start
+        tasks = [asyncio.create_task(self._open_async(chat))]
+        pending = set(tasks)
+        winner = None
+        hedged = False
+        error: BaseException | None = None
+        try:
+            while pending:
+                wake_at = deadline if hedge_at is None else min(deadline, hedge_at)
+                done, pending = await asyncio.wait(pending, timeout=max(wake_at - time.monotonic(), 0),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                        if task is not tasks[0]:
+                            record_llm_client_event("hedge_won")
+                        return task.result()
+                    error = task.exception()
+                if done:
+                    continue
+                if time.monotonic() >= deadline:
+                    record_llm_client_event("timeout")
+                    raise LLMTimeoutError(f"No LLM token within {self.first_token_timeout}s")
+                # Hedge only into a free slot, never queue behind other requests for it
+                hedge_at = None
+                if not slots.locked():
+                    await slots.acquire()
+                    hedged = True
+                    record_llm_client_event("hedge")
+                    tasks.append(asyncio.create_task(self._open_async(chat)))
+                    pending.add(tasks[-1])
+            raise error
+        finally:
+            for task in tasks:
+                if task is winner:
+                    continue
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled() and task.exception() is None:
+                    await close_async(task.result()[0])
+            if hedged:
+                slots.release()
+
+    async def astream(self, chat) -> AsyncIterator:
+        slots = self._get_async_slots()
+        try:
+            await asyncio.wait_for(slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            record_llm_client_event("rejected")
+            raise LLMUnavailableError(f"No LLM slot freed up within {self.queue_timeout}s") from None
+
+        try:
+            for attempt in range(self.max_retries + 1):
+                self.breaker.acquire()
+                start = time.monotonic()
+                try:
+                    iterator, first_chunk = await self._first_chunk_async(chat, slots, start)
+                    break
+                except Exception as e:
+                    await asyncio.sleep(self.retry_or_raise(attempt, e))
+            self.record_first_token(time.monotonic() - start)
+
+            deadline = start + self.total_timeout
+            try:
+                if first_chunk is not None:
+                    yield first_chunk
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(iterator.__anext__(), deadline - time.monotonic())
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        record_llm_client_event("timeout")
+                        raise LLMTimeoutError(f"LLM generation took longer than {self.total_timeout}s") from None
+                    yield chunk
+            except Exception as e:
+                if is_retryable(e):
+                    self.breaker.record_failure()
+                raise
+            else:
+                self.breaker.record_success()
+            finally:
+                await close_async(iterator)
+        finally:
+            slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "circuit_breaker": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "hedge_delay_ms": None if self.hedge_delay() is None else round(self.hedge_delay() * 1000, 1),
+            "first_token_samples": len(self.first_token_times),
+        }
+
+
+async def close_async(iterator) -> None:
+    aclose = getattr(iterator, "aclose", None)
+    if aclose is not None:
+        await aclose()
@@ -1,34 +1,144 @@
+import asyncio
+import contextvars
 import logging
-from opensearchpy import OpenSearch
+import unicodedata
+from concurrent.futures import Executor
+from functools import lru_cache
+from opensearchpy import AsyncOpenSearch, OpenSearch
 from datetime import datetime
 
-from interface.embedder import Embedder
+import numpy as np
+import torch
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import Integer, cast, column, func, select, true, values
+from sqlalchemy.orm import defer
+
+from interface.batching import BatchingEmbedder
+from interface.cache import TTLCache
+from interface.embedder import EMBEDDER_BACKENDS, Embedder, IEmbedder, configure_torch_threads
+from interface.metrics import record_cache_lookup, record_hits, stage
 from interface.schemas import EmbedderSettings, Context
-from interface.models_interface import Post
+from interface.models_interface import Post, PostChunk
+from interface.vector_store import MemoryVectorIndex
 
-from utils.database import SessionLocal
+from utils.database import SessionLocal, get_async_sessionmaker
+from utils.vector_index import set_search_params
 
 
 logger = logging.getLogger(__name__)
 
 
-def initialize_embedding_model(config: dict) -> Embedder:
+class CachedQueryEmbedder(IEmbedder):
+    """
+    Serves repeated query embeddings from an LRU + TTL cache in front of the wrapped embedder.
+    Documents and other doc types are always encoded by the wrapped embedder.
+    """
+
+    def __init__(self, embedder: Embedder, cache: TTLCache):
+        self.embedder = embedder
+        self.cache = cache
+        self.device = embedder.device
+
+    def __getattr__(self, name):
+        return getattr(self.embedder, name)
+
+    @staticmethod
+    def normalize(sentence: str) -> str:
+        return " ".join(unicodedata.normalize("NFKC", sentence).split())
+
+    @property
+    def supports_async(self) -> bool:
+        return getattr(self.embedder, "supports_async", False)
+
+    def _lookup(self, sentences: list[str], doc_type: str) -> tuple[list[str], list[str], list, list[int]]:
+        sentences = [self.normalize(sentence) for sentence in sentences]
+        keys = self.embedder.preprocess_sentences(sentences, doc_type)
+        vectors = [self.cache.get(key) for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        record_cache_lookup("query_embedding", hits=len(keys) - len(missing), misses=len(missing))
+        return sentences, keys, vectors, missing
+
+    def _fill(self, keys: list[str], vectors: list, missing: list[int], encoded: np.ndarray) -> np.ndarray:
+        for i, vector in zip(missing, encoded):
+            vectors[i] = vector.copy()
+            self.cache.set(keys[i], vectors[i])
+
+        logger.debug(f"Query embedding cache: {self.cache.stats()}")
+        return np.stack(vectors) if vectors else encoded
+
+    def encode(self, sentences: list[str], doc_type: str) -> np.ndarray:
+        if doc_type != "query":
+            return self.embedder.encode(sentences, doc_type)
+
+        sentences, keys, vectors, missing = self._lookup(sentences, doc_type)
+        return self._fill(keys, vectors, missing, self.embedder.encode([sentences[i] for i in missing], doc_type))
+
+    async def encode_async(self, sentences: list[str], doc_type: str) -> np.ndarray:
+        """
+        Only available when the wrapped embedder is async itself (see supports_async).
+        """
+        if doc_type != "query":
+            return await self.embedder.encode_async(sentences, doc_type)
+
+        sentences, keys, vectors, missing = self._lookup(sentences, doc_type)
+        encoded = await self.embedder.encode_async([sentences[i] for i in missing], doc_type)
+        return self._fill(keys, vectors, missing, encoded)
+
+
+def initialize_embedding_model(config: dict) -> IEmbedder:
     """
     Initializes and returns the embedding model using provided configuration.
     """
     try:
         settings = EmbedderSettings(**config["embedding_model"])
-        embedder = Embedder(settings)
-        logger.info(f"Initialized embedding model {settings.model_name}")
+        configure_torch_threads(settings.num_threads, settings.num_interop_threads)
+        embedder = EMBEDDER_BACKENDS[settings.backend](settings)
+        logger.info(f"Initialized embedding model {settings.model_name} ({settings.backend} backend, "
+                    f"{torch.get_num_threads()} threads)")
+
+        batching_config = config.get("query_batching", {})
+        if batching_config.get("enabled", False):
+            embedder = BatchingEmbedder(embedder, batching_config["max_batch_size"], batching_config["max_wait_ms"])
+            logger.info(f"Enabled query micro-batching: max_batch_size={embedder.max_batch_size}, "
+                        f"max_wait_ms={batching_config['max_wait_ms']}")
+
+        cache_config = config.get("query_embedding_cache", {})
+        if cache_config.get("enabled", False):
+            cache = TTLCache(max_size=cache_config["max_size"], ttl_seconds=cache_config["ttl_seconds"])
+            embedder = CachedQueryEmbedder(embedder, cache)
+            logger.info(f"Enabled query embedding cache: max_size={cache.max_size}, ttl={cache.ttl_seconds}s")
         return embedder
     except Exception as e:
         logger.error(f"Failed to initialize embedding model: {e}")
         raise
 
 
-def build_context_from_vectordb_response(doc: Post) -> Context:
+def warm_up_embedding_model(embedder: IEmbedder, config: dict) -> None:
+    """
+    Runs a forward pass at the query and at the full document length, so the first real requests don't
+    pay for lazy kernel initialization and allocator growth.
+    """
+    query = "warm-up " * 8
+    embedder.encode([query], doc_type="query")
+    embedder.encode([query * (config["embedding_model"]["max_length"] // 8)], doc_type="document")
+
+
+def get_data_version() -> int:
+    """
+    Returns the time of the latest write to posts in microseconds, which grows whenever the loader adds
+    a post, re-embeds a changed one or updates its metadata.
+    """
+    db = SessionLocal()
+    try:
+        updated_at = db.query(func.max(Post.updated_at)).scalar()
+        return int(updated_at.timestamp() * 1_000_000) if updated_at is not None else 0
+    finally:
+        db.close()
+
+
+def build_context_from_vectordb_response(doc: Post, text: str | None = None) -> Context:
     return Context(uid=doc.uid,
-                  text=doc.text_content,
+                  text=doc.text_content if text is None else text,
                   title=doc.title,
                   tags=list(doc.tags),
                   n_visits=int(doc.n_visits),
@@ -37,7 +147,7 @@ def build_context_from_vectordb_response(doc: Post) -> Context:
                   source="vector")
 
 
-def build_context_from_elastic_response(doc: dict) -> Context:
+def build_context_from_elastic_response(doc: dict, source: str = "fulltext") -> Context:
     return Context(uid=doc['uid'],
                   text=doc['text_content'],
                   title=doc['title'],
@@ -45,58 +155,387 @@ def build_context_from_elastic_response(doc: dict) -> Context:
                   n_visits=int(doc['n_visits']),
                   dt=datetime.fromisoformat(doc['dt']).replace(tzinfo=None),
                   href=f"http://fapl.ru/posts/{doc['uid']}/",
-                  source="fulltext")
+                  source=source)
+
 
+def encode_query(query: str, embedder: IEmbedder) -> list[float]:
+    with stage("encode_query"):
+        return embedder.encode([query], doc_type="query")[0].tolist()
+
+
+def encode_queries(queries: list[str], embedder: IEmbedder) -> list[list[float]]:
+    with stage("encode_query"):
+        return embedder.encode(queries, doc_type="query").tolist()
+
+
+async def encode_query_async(query: str, embedder: IEmbedder,
+                             executor: Executor | None = None) -> list[float]:
+    """
+    Batching embedders are awaited directly, so concurrent queries can share a forward pass;
+    any other embedder runs on the dedicated encoding executor.
+    """
+    if getattr(embedder, "supports_async", False):
+        with stage("encode_query"):
+            return (await embedder.encode_async([query], doc_type="query"))[0].tolist()
+    loop = asyncio.get_running_loop()
+    # Like asyncio.to_thread, carry the request context over so the stage lands in its timings
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(executor, context.run, encode_query, query, embedder)
+
+
+async def encode_queries_async(queries: list[str], embedder: IEmbedder,
+                               executor: Executor | None = None) -> list[list[float]]:
+    """
+    Batch variant of encode_query_async: all queries in one encoder call.
+    """
+    if getattr(embedder, "supports_async", False):
+        with stage("encode_query"):
+            return (await embedder.encode_async(queries, doc_type="query")).tolist()
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(executor, context.run, encode_queries, queries, embedder)
 
-def retrieve_semantic_search(db, query: str, embedder: Embedder, config: dict) -> list[Context]:
-    query_vector = embedder.encode([query], doc_type="query")[0].tolist()
+
+@lru_cache(maxsize=None)
+def get_memory_index(snapshot_dir: str, reload_check_seconds: float) -> MemoryVectorIndex:
+    return MemoryVectorIndex(snapshot_dir, reload_check_seconds)
+
+
+def search_memory_index(db, query_vector: list[float], config: dict) -> list[Context]:
+    """
+    Exact search over the in-process snapshot published by the loader; only the winners are read from Postgres.
+    """
+    return search_memory_index_batch(db, [query_vector], config)[0]
+
+
+def search_memory_index_batch(db, query_vectors: list[list[float]], config: dict) -> list[list[Context]]:
+    """
+    One matrix product for all queries, then a single primary-key fetch of the union of their winners.
+    """
+    memory_config = config["retrieval"]["memory_index"]
+    index = get_memory_index(memory_config["snapshot_dir"], memory_config["reload_check_seconds"])
+    similarity_threshold = config["retrieval"]["similarity_threshold"]
+    k = config["retrieval"]["top_k_chunks"] if config["chunking"]["enabled"] else config["retrieval"]["top_k_vector"]
+
+    snapshot, hits = index.search(np.asarray(query_vectors, dtype=np.float32), k)
+    # Same cut as the pgvector path, which compares cosine distances
+    ids_per_query = [[int(row_id) for row_id, score in zip(ids, scores) if 1 - score < similarity_threshold]
+                     for ids, scores in hits]
+    all_ids = sorted({row_id for ids in ids_per_query for row_id in ids})
+
+    if snapshot.table == "post_chunks":
+        results = (
+            db.query(PostChunk, Post)
+            .join(Post, Post.uid == PostChunk.post_uid)
+            .filter(PostChunk.id.in_(all_ids))
+            .options(defer(PostChunk.vector), defer(Post.vector))
+            .all()
+        )
+        by_id = {res.PostChunk.id: res for res in results}
+        return [group_chunks_by_post([by_id[row_id] for row_id in ids if row_id in by_id], config)
+                for ids in ids_per_query]
+
+    by_uid = {post.uid: post for post in db.query(Post).filter(Post.uid.in_(all_ids)).options(defer(Post.vector))}
+    return [[build_context_from_vectordb_response(by_uid[uid]) for uid in ids if uid in by_uid]
+            for ids in ids_per_query]
+
+
+def search_by_vector(db, query_vector: list[float], config: dict) -> list[Context]:
+    if config["retrieval"]["vector_backend"] == "memory":
+        return search_memory_index(db, query_vector, config)
+    if config["chunking"]["enabled"]:
+        return search_chunks_by_vector(db, query_vector, config)
 
     # Define parameters
     k = config["retrieval"]["top_k_vector"]
     similarity_threshold = config["retrieval"]["similarity_threshold"]
 
-    # Query the database for the most similar contexts based on cosine similarity
+    # ORDER BY distance LIMIT k without a WHERE on the distance, so the planner can walk the ANN index;
+    # the threshold is applied to the k nearest posts afterwards
+    set_search_params(db, config["vector_index"])
+    distance = Post.vector.cosine_distance(query_vector)
     results = (
-        db.query(
-            Post,
-            Post.vector.cosine_distance(query_vector).label("distance"),
-        )
-        .filter(
-            Post.vector.cosine_distance(query_vector) < similarity_threshold
-        )
-        .order_by("distance")
+        db.query(Post, distance.label("distance"))
+        .options(defer(Post.vector))
+        .order_by(distance)
         .limit(k)
         .all()
     )
-    return [build_context_from_vectordb_response(res.Post) for res in results]
+    return [build_context_from_vectordb_response(res.Post) for res in results if res.distance < similarity_threshold]
 
 
-def retrieve_fulltext_search(os_client: OpenSearch, config: dict, question: str) -> list[Context]:
-    top_k = config["retrieval"]["top_k_fulltext"]
+def group_chunks_by_post(results: list, config: dict) -> list[Context]:
+    """
+    Groups best-first (PostChunk, Post) rows by post. Every post becomes one context made of
+    its best matching chunks in article order; posts are ranked by their best chunk.
+    """
+    max_chunks_per_post = config["retrieval"]["max_chunks_per_post"]
+
+    grouped: dict[int, tuple[Post, list[PostChunk]]] = {}
+    for res in results:
+        post, chunks = grouped.setdefault(res.Post.uid, (res.Post, []))
+        if len(chunks) < max_chunks_per_post:
+            chunks.append(res.PostChunk)
+
+    return [
+        build_context_from_vectordb_response(
+            post, text="\n...\n".join(chunk.text_content for chunk in sorted(chunks, key=lambda c: c.chunk_index)))
+        for post, chunks in list(grouped.values())[:config["retrieval"]["top_k_vector"]]
+    ]
+
+
+def search_chunks_by_vector(db, query_vector: list[float], config: dict) -> list[Context]:
+    k = config["retrieval"]["top_k_chunks"]
+    similarity_threshold = config["retrieval"]["similarity_threshold"]
+
+    # The nearest chunks are picked in a subquery on post_chunks alone, which the ANN index can serve
+    set_search_params(db, config["vector_index"])
+    distance = PostChunk.vector.cosine_distance(query_vector)
+    nearest = (
+        db.query(PostChunk.id.label("id"), distance.label("distance"))
+        .order_by(distance)
+        .limit(k)
+        .subquery()
+    )
+    results = (
+        db.query(PostChunk, Post, nearest.c.distance)
+        .join(nearest, nearest.c.id == PostChunk.id)
+        .join(Post, Post.uid == PostChunk.post_uid)
+        .options(defer(PostChunk.vector), defer(Post.vector))
+        .order_by(nearest.c.distance)
+        .all()
+    )
+    return group_chunks_by_post([res for res in results if res.distance < similarity_threshold], config)
+
+
+def query_vectors_table(query_vectors: list[list[float]]):
+    """
+    The query vectors as an inline VALUES table (query_idx, query_vector) to join the nearest rows to.
+    """
+    return values(column("query_idx", Integer), column("query_vector", Vector(len(query_vectors[0]))),
+                  name="queries").data(list(enumerate(query_vectors)))
+
+
+def search_by_vector_batch(db, query_vectors: list[list[float]], config: dict) -> list[list[Context]]:
+    """
+    Batch variant of search_by_vector in a single round trip: every query vector picks its k nearest
+    rows in a LATERAL subquery, which the ANN index serves just like the single-query ORDER BY ... LIMIT.
+    """
+    if not query_vectors:
+        return []
+    if config["retrieval"]["vector_backend"] == "memory":
+        return search_memory_index_batch(db, query_vectors, config)
 
+    chunked = config["chunking"]["enabled"]
+    model = PostChunk if chunked else Post
+    k = config["retrieval"]["top_k_chunks"] if chunked else config["retrieval"]["top_k_vector"]
+    similarity_threshold = config["retrieval"]["similarity_threshold"]
+
+    queries = query_vectors_table(query_vectors)
+    # VALUES params arrive untyped, the cast makes the <=> operand a vector
+    distance = model.vector.cosine_distance(cast(queries.c.query_vector, Vector(len(query_vectors[0]))))
+    key = PostChunk.id if chunked else Post.uid
+    # Correlated to the VALUES table only: the outer query joins the same model for the winners
+    nearest = (select(key.label("id"), distance.label("distance"))
+               .correlate(queries).order_by(distance).limit(k).lateral("nearest"))
+
+    set_search_params(db, config["vector_index"])
+    query = (
+        db.query(queries.c.query_idx, nearest.c.distance, *((PostChunk, Post) if chunked else (Post,)))
+        .select_from(queries)
+        .join(nearest, true())
+    )
+    if chunked:
+        query = (query.join(PostChunk, PostChunk.id == nearest.c.id)
+                 .join(Post, Post.uid == PostChunk.post_uid)
+                 .options(defer(PostChunk.vector), defer(Post.vector)))
+    else:
+        query = query.join(Post, Post.uid == nearest.c.id).options(defer(Post.vector))
+    results = query.order_by(queries.c.query_idx, nearest.c.distance).all()
+
+    rows_per_query: list[list] = [[] for _ in query_vectors]
+    for res in results:
+        if res.distance < similarity_threshold:
+            rows_per_query[res.query_idx].append(res)
+    if chunked:
+        return [group_chunks_by_post(rows, config) for rows in rows_per_query]
+    return [[build_context_from_vectordb_response(res.Post) for res in rows] for rows in rows_per_query]
+
+
+def retrieve_semantic_search(db, query: str, embedder: IEmbedder, config: dict) -> list[Context]:
+    query_vector = encode_query(query, embedder)
+    with stage("vector_search"):
+        contexts = search_by_vector(db, query_vector, config)
+    record_hits("vector", len(contexts))
+    return contexts
+
+
+def _search_by_vector_in_session(query_vector: list[float], config: dict) -> list[Context]:
+    db = SessionLocal()
+    try:
+        return search_by_vector(db, query_vector, config)
+    finally:
+        db.close()
+
+
+def _search_by_vector_batch_in_session(query_vectors: list[list[float]], config: dict) -> list[list[Context]]:
+    db = SessionLocal()
+    try:
+        return search_by_vector_batch(db, query_vectors, config)
+    finally:
+        db.close()
+
+
+async def search_by_vector_batch_async(query_vectors: list[list[float]], config: dict) -> list[list[Context]]:
+    with stage("vector_search"):
+        if config["database"]["async_enabled"] and config["retrieval"]["vector_backend"] != "memory":
+            async with get_async_sessionmaker()() as db:
+                results = await db.run_sync(search_by_vector_batch, query_vectors, config)
+        else:
+            results = await asyncio.to_thread(_search_by_vector_batch_in_session, query_vectors, config)
+    for contexts in results:
+        record_hits("vector", len(contexts))
+    return results
+
+
+async def search_by_vector_async(query_vector: list[float], config: dict) -> list[Context]:
+    """
+    With database.async_enabled the pgvector query runs on a pooled asyncpg session, otherwise on a worker thread.
+    The memory backend always takes a thread: its matmul would block the event loop.
+    """
+    if config["database"]["async_enabled"] and config["retrieval"]["vector_backend"] != "memory":
+        async with get_async_sessionmaker()() as db:
+            return await db.run_sync(search_by_vector, query_vector, config)
+    return await asyncio.to_thread(_search_by_vector_in_session, query_vector, config)
+
+
+async def retrieve_semantic_search_async(query: str, embedder: IEmbedder, config: dict,
+                                         executor: Executor | None = None) -> list[Context]:
+    """
+    Encodes the query off the event loop (see encode_query_async), then runs the vector search without blocking it.
+    """
+    query_vector = await encode_query_async(query, embedder, executor)
+    with stage("vector_search"):
+        contexts = await search_by_vector_async(query_vector, config)
+    record_hits("vector", len(contexts))
+    return contexts
+
+
+async def search_opensearch_async(os_client: OpenSearch | AsyncOpenSearch, **kwargs) -> dict:
+    """
+    Awaits AsyncOpenSearch directly and runs the blocking client on a worker thread.
+    """
+    if isinstance(os_client, AsyncOpenSearch):
+        return await os_client.search(**kwargs)
+    return await asyncio.to_thread(os_client.search, **kwargs)
+
+
+def build_fulltext_query(question: str) -> dict:
     # Constructing the query for multiple fields
-    query = {
-        "query": {
-            "bool": {
-                "should": [
-                    {"multi_match": {
-                        "query": question,
-                        "fields": ["title^2", "text_content"],  # Boosting title field
-                        "type": "best_fields"
-                    }},
-                    {"term": {"tags": question.lower()}}  # Assuming tags are stored in lowercase
-                ]
-            }
+    return {
+        "bool": {
+            "should": [
+                {"multi_match": {
+                    "query": question,
+                    "fields": ["title^2", "text_content"],  # Boosting title field
+                    "type": "best_fields"
+                }},
+                {"term": {"tags": question.lower()}}  # Assuming tags are stored in lowercase
+            ]
+        }
+    }
+
+
+def build_fulltext_request(config: dict, question: str) -> dict:
+    return {
+        "index": config["os_params"]["index_name"],
+        "body": {
+            "query": build_fulltext_query(question),
+            "size": config["retrieval"]["top_k_fulltext"],
+            "_source": {"excludes": ["vector"]},
         },
-        "size": top_k
     }
 
+
+def retrieve_fulltext_search(os_client: OpenSearch, config: dict, question: str) -> list[Context]:
     # Executing the search query
-    response = os_client.search(index=config["os_params"]["index_name"], body=query)
+    with stage("opensearch"):
+        response = os_client.search(**build_fulltext_request(config, question))
 
+    record_hits("fulltext", len(response['hits']['hits']))
     return [build_context_from_elastic_response(hit['_source']) for hit in response['hits']['hits']]
 
 
+async def retrieve_fulltext_search_async(os_client: OpenSearch | AsyncOpenSearch, config: dict,
+                                         question: str) -> list[Context]:
+    with stage("opensearch"):
+        response = await search_opensearch_async(os_client, **build_fulltext_request(config, question))
+    record_hits("fulltext", len(response['hits']['hits']))
+    return [build_context_from_elastic_response(hit['_source']) for hit in response['hits']['hits']]
+
+
+def build_hybrid_request(config: dict, query_vector: list[float], question: str) -> dict:
+    """
+    One OpenSearch round trip for both retrievers: BM25 and k-NN scores are normalized and fused
+    by the search pipeline configured in os_params.hybrid_pipeline.
+    """
+    top_k = config["retrieval"]["hybrid"]["top_k"]
+    return {
+        "index": config["os_params"]["index_name"],
+        "body": {
+            "query": {
+                "hybrid": {
+                    "queries": [
+                        build_fulltext_query(question),
+                        {"knn": {"vector": {"vector": query_vector, "k": top_k}}},
+                    ]
+                }
+            },
+            "size": top_k,
+            "_source": {"excludes": ["vector"]},
+        },
+        "params": {"search_pipeline": config["os_params"]["hybrid_pipeline"]},
+    }
+
+
+def retrieve_hybrid_search(os_client: OpenSearch, query_vector: list[float], question: str,
+                           config: dict) -> list[Context]:
+    with stage("opensearch"):
+        response = os_client.search(**build_hybrid_request(config, query_vector, question))
+    record_hits("hybrid", len(response['hits']['hits']))
+    return [build_context_from_elastic_response(hit['_source'], source="hybrid") for hit in response['hits']['hits']]
+
+
+async def retrieve_hybrid_search_async(query: str, embedder: IEmbedder, config: dict,
+                                       os_client: OpenSearch | AsyncOpenSearch,
+                                       executor: Executor | None = None) -> list[Context]:
+    query_vector = await encode_query_async(query, embedder, executor)
+    with stage("opensearch"):
+        response = await search_opensearch_async(os_client, **build_hybrid_request(config, query_vector, query))
+    record_hits("hybrid", len(response['hits']['hits']))
+    return [build_context_from_elastic_response(hit['_source'], source="hybrid") for hit in response['hits']['hits']]
+
+
+async def msearch_async(os_client: OpenSearch | AsyncOpenSearch, requests: list[dict]) -> list[dict]:
+    """
+    Sends search requests built by build_*_request in one _msearch round trip and returns their responses
+    in order. The requests share the URL params (e.g. the hybrid search pipeline) of the first one.
+    """
+    body = []
+    for request in requests:
+        body.extend(({"index": request["index"]}, request["body"]))
+    params = requests[0].get("params") if requests else None
+    if isinstance(os_client, AsyncOpenSearch):
+        response = await os_client.msearch(body=body, params=params)
+    else:
+        response = await asyncio.to_thread(os_client.msearch, body=body, params=params)
+
+    for item in response["responses"]:
+        if "error" in item:
+            raise RuntimeError(f"OpenSearch msearch failed: {item['error']}")
+    return response["responses"]
+
+
 def deduplicate_and_sort(contexts: list[Context]) -> list[Context]:
     deduplicated = {context.uid: context for context in contexts}.values()
     sorted_contexts = sorted(deduplicated, key=lambda c: c.dt, reverse=True)
@@ -104,25 +543,109 @@ def deduplicate_and_sort(contexts: list[Context]) -> list[Context]:
     return sorted_contexts
 
 
-def retrieve_contexts(query: str, embedder: Embedder, config: dict, os_client: OpenSearch) -> list[Context]:
+def select_top_contexts(top_chunks: list[Context], config: dict) -> list[Context]:
+    result = deduplicate_and_sort(top_chunks)[:config["retrieval"]["top_k"]]
+    logger.info(f"Retrieved top {len(result)} contexts for the query")
+    return result
+
+
+def retrieve_contexts(query: str, embedder: IEmbedder, config: dict, os_client: OpenSearch) -> list[Context]:
     """
     Retrieves the most relevant contexts from DataChunks for a given query using vector search.
     """
-    db = SessionLocal()
-    top_chunks = []
-    try:
-        if config["retrieval"]["vector_search_enabled"]:
-            top_chunks.extend(retrieve_semantic_search(db, query, embedder, config))
-        if config["retrieval"]["fulltext_search_enabled"]:
-            top_chunks.extend(retrieve_fulltext_search(os_client, config, query))
+    with stage("retrieve_contexts"):
+        if config["retrieval"]["hybrid"]["enabled"]:
+            return select_top_contexts(
+                retrieve_hybrid_search(os_client, encode_query(query, embedder), query, config), config)
+
+        db = SessionLocal()
+        top_chunks = []
+        try:
+            if config["retrieval"]["vector_search_enabled"]:
+                top_chunks.extend(retrieve_semantic_search(db, query, embedder, config))
+            if config["retrieval"]["fulltext_search_enabled"]:
+                top_chunks.extend(retrieve_fulltext_search(os_client, config, query))
+
+            return select_top_contexts(top_chunks, config)
+        except Exception as e:
+            logger.error(f"Error retrieving contexts: {e}")
+            raise
+        finally:
+            db.close()
+
 
-        top_chunks = deduplicate_and_sort(top_chunks)
+async def retrieve_contexts_async(query: str, embedder: IEmbedder, config: dict,
+                                  os_client: OpenSearch | AsyncOpenSearch, executor: Executor | None = None) -> list[Context]:
+    """
+    Async variant of retrieve_contexts: vector and full-text branches run concurrently,
+    so the retrieval latency is the slower of the two rather than their sum.
+    """
+    branches = []
+    if config["retrieval"]["hybrid"]["enabled"]:
+        branches.append(retrieve_hybrid_search_async(query, embedder, config, os_client, executor))
+    elif config["retrieval"]["vector_search_enabled"]:
+        branches.append(retrieve_semantic_search_async(query, embedder, config, executor))
+    if config["retrieval"]["fulltext_search_enabled"] and not config["retrieval"]["hybrid"]["enabled"]:
+        branches.append(retrieve_fulltext_search_async(os_client, config, query))
 
-        result = top_chunks[:config["retrieval"]["top_k"]]
-        logger.info(f"Retrieved top {len(result)} contexts for the query")
-        return result
+    try:
+        with stage("retrieve_contexts"):
+            results = await asyncio.gather(*branches)
+        return select_top_contexts([context for result in results for context in result], config)
     except Exception as e:
         logger.error(f"Error retrieving contexts: {e}")
         raise
-    finally:
-        db.close()
+
+
+async def retrieve_contexts_batch_async(queries: list[str], embedder: IEmbedder, config: dict,
+                                        os_client: OpenSearch | AsyncOpenSearch,
+                                        executor: Executor | None = None) -> list[list[Context]]:
+    """
+    Batch variant of retrieve_contexts_async with a fixed number of round trips whatever the batch size:
+    one encoder call for all queries, one SQL query for their vector searches and one _msearch for
+    their full-text (or hybrid) searches. Returns the top contexts of every query, in order.
+    """
+    if not queries:
+        return []
+    retrieval_config = config["retrieval"]
+    hybrid = retrieval_config["hybrid"]["enabled"]
+    vector_search = retrieval_config["vector_search_enabled"] and not hybrid
+    fulltext_search = retrieval_config["fulltext_search_enabled"] and not hybrid
+    top_chunks: list[list[Context]] = [[] for _ in queries]
+
+    async def search_opensearch(requests: list[dict], source: str) -> None:
+        with stage("opensearch"):
+            responses = await msearch_async(os_client, requests)
+        for position, response in enumerate(responses):
+            hits = response["hits"]["hits"]
+            record_hits(source, len(hits))
+            top_chunks[position].extend(build_context_from_elastic_response(hit["_source"], source=source)
+                                        for hit in hits)
+
+    async def search_vectors(query_vectors: list[list[float]]) -> None:
+        for position, contexts in enumerate(await search_by_vector_batch_async(query_vectors, config)):
+            top_chunks[position].extend(contexts)
+
+    try:
+        with stage("retrieve_contexts"):
+            branches = []
+            if fulltext_search:
+                # Does not need the vectors, so it runs while the queries are being encoded
+                branches.append(asyncio.create_task(search_opensearch(
+                    [build_fulltext_request(config, query) for query in queries], "fulltext")))
+            if hybrid or vector_search:
+                query_vectors = await encode_queries_async(queries, embedder, executor)
+                if hybrid:
+                    branches.append(search_opensearch(
+                        [build_hybrid_request(config, vector, query) for query, vector in zip(queries, query_vectors)],
+                        "hybrid"))
+                else:
+                    branches.append(search_vectors(query_vectors))
+            await asyncio.gather(*branches)
+    except Exception as e:
+        for branch in branches:
+            if isinstance(branch, asyncio.Task):
+                branch.cancel()
+        logger.error(f"Error retrieving contexts for a batch of {len(queries)} queries: {e}")
+        raise
+    return [select_top_contexts(chunks, config) for chunks in top_chunks]
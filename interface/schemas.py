@@ -16,17 +16,26 @@ class Post(BaseModel):
 
 class EmbedderSettings(BaseModel):
     batch_size: int = 16
+    max_length: int = 512
     model_name: str
     model_type: str
     dimension: int
     prefix_query: str
     prefix_document: str
+    backend: str = "torch"
+    num_threads: int | None = None
+    num_interop_threads: int | None = None
+    mmap_weights: bool = True
 
 
 class QuestionCreate(BaseModel):
     question: str
 
 
+class QuestionBatchCreate(BaseModel):
+    questions: list[str]
+
+
 class Context(BaseModel):
     uid: int
     text: str
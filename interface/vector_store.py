@@ -0,0 +1,139 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, NamedTuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = "CURRENT"
+SNAPSHOT_PREFIX = "snapshot-"
+
+
+class Snapshot(NamedTuple):
+    name: str
+    table: str
+    ids: np.ndarray
+    vectors: np.ndarray
+
+
+def publish_snapshot(root: str | Path, table: str, rows: Iterable[tuple[int, Iterable[float]]], count: int,
+                     dimension: int, keep: int = 2) -> str:
+    """
+    Writes (id, vector) rows into a new snapshot directory and then atomically points CURRENT at it,
+    so readers never see a half-written snapshot. Only the newest `keep` snapshots are kept on disk.
+    """
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    name = f"{SNAPSHOT_PREFIX}{time.time_ns()}"
+    tmp_dir = root / f".{name}"
+    tmp_dir.mkdir()
+
+    ids = np.lib.format.open_memmap(tmp_dir / "ids.npy", mode="w+", dtype=np.int64, shape=(count,))
+    vectors = np.lib.format.open_memmap(tmp_dir / "vectors.npy", mode="w+", dtype=np.float32,
+                                        shape=(count, dimension))
+    n_rows = 0
+    for n_rows, (row_id, vector) in enumerate(rows, start=1):
+        ids[n_rows - 1] = row_id
+        vectors[n_rows - 1] = vector
+    if n_rows != count:
+        raise ValueError(f"Expected {count} rows for the snapshot, got {n_rows}")
+    ids.flush()
+    vectors.flush()
+    del ids, vectors
+
+    (tmp_dir / "meta.json").write_text(json.dumps({"table": table, "count": count, "dimension": dimension}))
+    os.replace(tmp_dir, root / name)
+
+    pointer = root / f".{CURRENT_FILE}.{name}"
+    pointer.write_text(name)
+    os.replace(pointer, root / CURRENT_FILE)
+    logger.info("Published vector snapshot '%s' with '%s' rows of %s", name, count, table)
+
+    # Processes still mapping a removed snapshot keep reading it until they reload
+    for stale in sorted(root.glob(f"{SNAPSHOT_PREFIX}*"))[:-keep]:
+        shutil.rmtree(stale, ignore_errors=True)
+    return name
+
+
+class MemoryVectorIndex:
+    """
+    Exact cosine search over a memory-mapped snapshot of normalized vectors.
+    The snapshot is re-checked at most every reload_check_seconds and swapped in without blocking searches.
+    """
+
+    def __init__(self, root: str | Path, reload_check_seconds: float = 10.0, timer=time.monotonic):
+        self.root = Path(root)
+        self.reload_check_seconds = reload_check_seconds
+        self.timer = timer
+        self._snapshot: Snapshot | None = None
+        self._checked_at: float | None = None
+        self._reload_lock = threading.Lock()
+
+    def _read_current(self) -> str | None:
+        try:
+            return (self.root / CURRENT_FILE).read_text().strip()
+        except FileNotFoundError:
+            return None
+
+    def _load(self, name: str) -> Snapshot:
+        path = self.root / name
+        meta = json.loads((path / "meta.json").read_text())
+        return Snapshot(name=name,
+                        table=meta["table"],
+                        ids=np.load(path / "ids.npy", mmap_mode="r"),
+                        vectors=np.load(path / "vectors.npy", mmap_mode="r"))
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        Maps the snapshot CURRENT points at if it changed. Returns True when a new snapshot was swapped in.
+        """
+        now = self.timer()
+        if not force and self._snapshot is not None and now - self._checked_at < self.reload_check_seconds:
+            return False
+        if not self._reload_lock.acquire(blocking=self._snapshot is None):
+            return False
+        try:
+            self._checked_at = now
+            name = self._read_current()
+            if name is None or (self._snapshot is not None and self._snapshot.name == name):
+                return False
+            # Searches hold a reference to the old snapshot, so replacing the attribute is enough
+            self._snapshot = self._load(name)
+            logger.info("Loaded vector snapshot '%s' with '%s' rows", name, len(self._snapshot.ids))
+            return True
+        finally:
+            self._reload_lock.release()
+
+    @property
+    def snapshot(self) -> Snapshot:
+        self.reload()
+        if self._snapshot is None:
+            raise RuntimeError(f"No vector snapshot published in {self.root}")
+        return self._snapshot
+
+    def search(self, queries: np.ndarray, k: int) -> tuple[Snapshot, list[tuple[np.ndarray, np.ndarray]]]:
+        """
+        Returns, for every row of queries, the ids and cosine similarities of its k nearest vectors, best first.
+        """
+        snapshot = self.snapshot
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        k = min(k, len(snapshot.ids))
+        if k == 0:
+            return snapshot, [(snapshot.ids[:0], np.empty(0, dtype=np.float32)) for _ in queries]
+
+        scores = queries @ snapshot.vectors.T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        return snapshot, [(snapshot.ids[row], row_scores) for row, row_scores in zip(top, top_scores)]
+
+    def __len__(self) -> int:
+        return len(self.snapshot.ids)
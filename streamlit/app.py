@@ -1,6 +1,8 @@
+import json
+from typing import Iterator
+
 import streamlit as st
 import requests
-import time
 
 st.set_page_config(page_title="FAPL RAG", page_icon="⚽")
 st.title("FAPL RAG")
@@ -29,15 +31,33 @@ st.markdown(
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
-def send_message_to_rag(user_input: str) -> str:
-    api_url = "http://interface:8000/ask/"
+def read_sse(response: requests.Response) -> Iterator[tuple[str, dict]]:
+    event, data = "message", []
+    for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+
+
+def send_message_to_rag(user_input: str) -> Iterator[str]:
+    api_url = "http://interface:8000/ask/stream"
     payload = {"question": user_input}
     try:
-        response = requests.post(api_url, json=payload)
-        response.raise_for_status()
-        return response.json().get("response", "No valid response from RAG.")
+        with requests.post(api_url, json=payload, stream=True) as response:
+            response.raise_for_status()
+            response.encoding = "utf-8"
+            for event, data in read_sse(response):
+                if event == "delta":
+                    yield data["text"]
+                elif event == "error":
+                    yield data.get("response", "No valid response from RAG.")
     except requests.exceptions.RequestException:
-        return "Error: Could not reach the backend."
+        yield "Error: Could not reach the backend."
 
 for msg in st.session_state.messages:
     with st.chat_message(msg["role"]):
@@ -49,12 +69,6 @@ if user_input := st.chat_input("Напишите свой вопрос..."):
         st.markdown(user_input)
 
     with st.chat_message("assistant"):
-        msg_placeholder = st.empty()
-        partial_response = ""
-        full_response = send_message_to_rag(user_input)
-        for word in full_response.split():
-            partial_response += word + " "
-            msg_placeholder.markdown(partial_response)
-            time.sleep(0.04)
+        full_response = st.write_stream(send_message_to_rag(user_input))
 
     st.session_state.messages.append({"role": "assistant", "content": full_response})
@@ -1,16 +1,23 @@
 import logging
-from typing import Any, Dict, Iterator, List
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List
 
-import more_itertools
-from opensearchpy import OpenSearch, OpenSearchException
-from opensearchpy.helpers import bulk
+from opensearchpy import OpenSearch, OpenSearchException, TransportError
+from opensearchpy.helpers import scan, streaming_bulk
 
 from schemas import Post
 
 logger = logging.getLogger(__name__)
 
 
-def create_index(index_name: str, os_client: OpenSearch) -> None:
+def create_index(index_name: str, os_client: OpenSearch, knn_config: Dict | None = None,
+                 dimension: int | None = None) -> bool:
+    """
+    Creates the index unless it exists. Returns whether it was created, i.e. holds no documents yet.
+    """
     mapping: Dict = {
         "mappings": {
             "properties": {
@@ -25,12 +32,92 @@ def create_index(index_name: str, os_client: OpenSearch) -> None:
         }
     }
 
+    if knn_config is not None:
+        mapping["settings"] = {"index": {"knn": True, "knn.algo_param.ef_search": knn_config["ef_search"]}}
+        mapping["mappings"]["properties"]["vector"] = {
+            "type": "knn_vector",
+            "dimension": dimension,
+            "method": {
+                "name": "hnsw",
+                "space_type": "cosinesimil",
+                "engine": knn_config["engine"],
+                "parameters": {"m": knn_config["m"], "ef_construction": knn_config["ef_construction"]},
+            },
+        }
+
     if not os_client.indices.exists(index=index_name):
         os_client.indices.create(index=index_name, body=mapping)
         logger.info(f"Successfully created index {index_name}")
+        return True
+    if knn_config is not None and "vector" not in \
+            os_client.indices.get_mapping(index=index_name)[index_name]["mappings"].get("properties", {}):
+        logger.warning(f"Index {index_name} was created without the knn_vector field, delete it to enable "
+                       f"hybrid search: the next load recreates it with the stored vectors of all posts")
+    return False
+
+
+def get_indexed_ids(index_name: str, os_client: OpenSearch, with_field: str | None = None,
+                    batch_size: int = 5000) -> set[int]:
+    """
+    Returns the ids of all documents in the index (only of those that have with_field, if given)
+    without fetching their sources.
+    """
+    query = {"exists": {"field": with_field}} if with_field else {"match_all": {}}
+    return {int(hit["_id"]) for hit in scan(os_client, index=index_name, size=batch_size,
+                                            query={"query": query, "_source": False})}
+
+
+def create_hybrid_pipeline(pipeline_name: str, os_client: OpenSearch, bm25_weight: float, knn_weight: float) -> None:
+    """
+    Creates (or replaces) the search pipeline that normalizes BM25 and k-NN scores and fuses them.
+    """
+    os_client.search_pipeline.put(id=pipeline_name, body={
+        "description": "Min-max normalized weighted fusion of BM25 and k-NN scores",
+        "phase_results_processors": [{
+            "normalization-processor": {
+                "normalization": {"technique": "min_max"},
+                "combination": {
+                    "technique": "arithmetic_mean",
+                    "parameters": {"weights": [bm25_weight, knn_weight]},
+                },
+            }
+        }],
+    })
+    logger.info(f"Successfully created search pipeline {pipeline_name}")
+
+
+@contextmanager
+def fast_indexing(index_name: str, os_client: OpenSearch, max_num_segments: int | None = None,
+                  forcemerge_timeout_seconds: float = 1800) -> Iterator[None]:
+    """
+    Turns off periodic refreshes and replicas of the index for a large load, restores the previous
+    settings afterwards and, if the load went through, force-merges the index to max_num_segments.
+    Documents indexed meanwhile only become searchable once the settings are restored.
+    """
+    names = ("index.refresh_interval", "index.number_of_replicas")
+    settings = os_client.indices.get_settings(index=index_name, name=",".join(names), flat_settings=True)
+    # An unset refresh_interval is restored as null, i.e. back to the default
+    previous = {"index.refresh_interval": None, **settings[index_name]["settings"]}
 
+    os_client.indices.put_settings(index=index_name,
+                                   body={"index.refresh_interval": "-1", "index.number_of_replicas": 0})
+    logger.info(f"Paused refreshes and replicas of index {index_name} for bulk loading (previously {previous})")
+    try:
+        yield
+    finally:
+        os_client.indices.put_settings(index=index_name, body=previous)
+        os_client.indices.refresh(index=index_name)
+        logger.info(f"Restored refresh and replica settings of index {index_name}")
 
-def load(posts: List[Post]) -> Iterator[Any]:
+    if max_num_segments:
+        start = time.perf_counter()
+        os_client.indices.forcemerge(index=index_name, max_num_segments=max_num_segments,
+                                     request_timeout=forcemerge_timeout_seconds)
+        logger.info(f"Force-merged index {index_name} to {max_num_segments} segments "
+                    f"in {time.perf_counter() - start:.1f}s")
+
+
+def load(posts: Iterable[Post]) -> Iterator[Any]:
     for post in posts:
         try:
             yield generate_document_source(post)
@@ -39,7 +126,7 @@ def load(posts: List[Post]) -> Iterator[Any]:
 
 
 def generate_document_source(post: Post) -> Dict[str, str]:
-    return {
+    source = {
                 "uid": post.uid,
                 "title": post.title,
                 "text_content": post.text_content,
@@ -48,31 +135,126 @@ def generate_document_source(post: Post) -> Dict[str, str]:
                 "author": post.author,
                 "dt": post.dt
             }
+    if post.vector is not None:
+        source["vector"] = post.vector
+    return source
 
 
-def update_search(posts: list[Post], os_client: OpenSearch, batch_size: int = 500) -> None:
-    total_inserted_docs: int = 0
-    total_errors: int = 0
-
-    for chunk in more_itertools.ichunked(load(posts), batch_size):
-        bucket_data = []
-        for document in chunk:
+def generate_actions(posts: Iterable[Post], index_name: str, partial: bool = False) -> Iterator[Dict]:
+    for document in load(posts):
+        if partial:
+            cur = {
+                "_op_type": "update",
+                "_index": index_name,
+                "doc": document,
+                "doc_as_upsert": True,
+            }
+        else:
             cur = {
-                "_index": "posts",
+                "_index": index_name,
                 "_source": document,
             }
-            if 'uid' in document:
-                cur['_id'] = document['uid']
-            bucket_data.append(cur)
+        if 'uid' in document:
+            cur['_id'] = document['uid']
+        yield cur
+
+
+class SharedIterator:
+    """
+    Hands the items of one lazy iterator out to several bulk threads; close() makes it look exhausted.
+    """
+
+    def __init__(self, iterable: Iterable):
+        self._iterator = iter(iterable)
+        self._lock = threading.Lock()
+        self._closed = False
+        self.n_taken = 0
+
+    def __iter__(self) -> "SharedIterator":
+        return self
+
+    def __next__(self):
+        with self._lock:
+            if self._closed:
+                raise StopIteration
+            item = next(self._iterator)
+            self.n_taken += 1
+            return item
+
+    def close(self) -> None:
+        self._closed = True
+
+
+class RejectionCountingClient:
+    """
+    Passes bulk requests through to the client and counts the documents OpenSearch rejected with 429
+    (a full write queue), which streaming_bulk retries with backoff.
+    """
+
+    def __init__(self, client: OpenSearch):
+        self.client = client
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def _count(self, n_rejected: int) -> None:
+        if n_rejected:
+            with self._lock:
+                self.rejected += n_rejected
+
+    def bulk(self, body, *args, **kwargs):
         try:
-            inserted, errors = bulk(os_client, bucket_data, max_retries=4, raise_on_error=False)
-            errors_num = len(errors) if isinstance(errors, list) else errors  # type: ignore
-            logger.debug(f"{inserted} docs successfully inserted by bulk with {errors_num} errors")
-            total_inserted_docs += inserted
-            total_errors += errors_num
-            if isinstance(errors, list):  # type: ignore
-                for error in errors:  # type: ignore
-                    logger.error(f"Doc was not inserted with error: {error}")
-        except OpenSearchException as e:
-            logger.exception(f"Error while pushing data to opensearch: {e}")
+            response = self.client.bulk(body, *args, **kwargs)
+        except TransportError as e:
+            if e.status_code == 429:
+                self._count(body.count("\n") // 2)  # every index and update action takes two lines
             raise
+        self._count(sum(1 for item in response["items"] if next(iter(item.values())).get("status") == 429))
+        return response
+
+
+def update_search(posts: Iterable[Post], os_client: OpenSearch, index_name: str = "posts", batch_size: int = 500,
+                  partial: bool = False, thread_count: int = 1, max_chunk_bytes: int = 10 * 1024 * 1024,
+                  max_retries: int = 4, initial_backoff: float = 2.0) -> int:
+    """
+    Indexes posts in bulk. With partial=True existing documents are updated in place instead,
+    so fields missing from the posts (e.g. an already indexed vector) are kept.
+
+    Posts are read lazily; every one of thread_count threads keeps a bulk request of at most batch_size
+    documents and max_chunk_bytes in flight. Documents rejected with 429 are retried after initial_backoff seconds,
+    doubled on every further retry. Returns the number of indexed documents.
+    """
+    client = RejectionCountingClient(os_client)
+    actions = SharedIterator(generate_actions(posts, index_name, partial))
+    start = time.perf_counter()
+
+    def index_shard() -> int:
+        errors = 0
+        try:
+            # Only failed docs are yielded, rejected ones after max_retries backoffs
+            for _, item in streaming_bulk(client, actions, chunk_size=batch_size, max_chunk_bytes=max_chunk_bytes,
+                                          max_retries=max_retries, initial_backoff=initial_backoff,
+                                          raise_on_error=False, yield_ok=False):
+                errors += 1
+                logger.error(f"Doc was not inserted with error: {item}")
+        except Exception:
+            actions.close()  # the other threads stop after their current request
+            raise
+        return errors
+
+    try:
+        with ThreadPoolExecutor(max_workers=thread_count, thread_name_prefix="bulk") as pool:
+            futures = [pool.submit(index_shard) for _ in range(thread_count)]
+            total_errors = sum(future.result() for future in futures)
+    except OpenSearchException as e:
+        logger.exception(f"Error while pushing data to opensearch: {e}")
+        raise
+
+    total_inserted_docs = actions.n_taken - total_errors
+    elapsed = time.perf_counter() - start
+    logger.info(f"Indexed {total_inserted_docs} docs into {index_name} in {elapsed:.1f}s "
+                f"({total_inserted_docs / elapsed if elapsed else 0.0:.0f} docs/sec) "
+                f"with {total_errors} errors and {client.rejected} rejections")
+    return total_inserted_docs
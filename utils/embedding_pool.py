@@ -0,0 +1,108 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Iterable, Iterator
+
+import more_itertools
+import numpy as np
+import torch
+
+from schemas import EmbedderSettings, Post
+
+logger = logging.getLogger(__name__)
+
+# Per-process state of the pool workers, set once by _init_worker
+_embedder = None
+_chunker = None
+_embed_posts = None
+
+
+def _init_worker(settings: dict, chunking: dict | None, num_threads: int) -> None:
+    global _embedder, _chunker, _embed_posts
+    # Set before the model runs anything, so every worker stays on its own share of the cores
+    torch.set_num_threads(num_threads)
+    torch.set_num_interop_threads(1)
+
+    from chunker import TokenChunker
+    from embedder import Embedder
+    from loader import embed_posts
+
+    _embedder = Embedder(EmbedderSettings(**settings))
+    if chunking is not None:
+        _chunker = TokenChunker(_embedder.tokenizer, chunking["chunk_size"], chunking["overlap"])
+    _embed_posts = embed_posts
+    logger.info("Embedding worker %s loaded '%s' with %s threads", os.getpid(), _embedder.model_name, num_threads)
+
+
+def _embed_shard(shard_id: int, posts: list[Post]) -> tuple[int, np.ndarray, list[dict]]:
+    return shard_id, *_embed_posts(posts, _embedder, _chunker)
+
+
+class EmbeddingPool:
+    """
+    Encodes posts in a pool of processes that each load the embedding model once.
+    Shards are yielded as soon as they are encoded, so the caller can store them while the rest are in flight.
+    """
+
+    def __init__(self, settings: EmbedderSettings, workers: int, shard_size: int,
+                 threads_per_worker: int | None = None, chunking: dict | None = None):
+        self.workers = workers
+        self.shard_size = shard_size
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+        # spawn: forking a process that already runs torch thread pools can deadlock the children
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(settings.model_dump(), chunking, self.threads_per_worker),
+        )
+        logger.info("Started embedding pool: %s workers x %s threads, shards of %s posts",
+                    workers, self.threads_per_worker, shard_size)
+
+    @classmethod
+    def from_config(cls, config: dict) -> "EmbeddingPool":
+        data_config = config["data"]
+        return cls(
+            settings=EmbedderSettings(**config["embedding_model"]),
+            workers=data_config["embedding_workers"],
+            shard_size=data_config["embedding_shard_size"],
+            threads_per_worker=data_config["embedding_threads_per_worker"],
+            chunking=config["chunking"] if config["chunking"]["enabled"] else None,
+        )
+
+    def map_shards(self, posts: Iterable[Post]) -> Iterator[tuple[list[Post], np.ndarray, list[dict]]]:
+        """
+        Yields (posts, post vectors, chunk rows) per shard in completion order.
+        At most two shards per worker are in flight, which bounds memory on large loads.
+        """
+        shards = enumerate(more_itertools.chunked(posts, self.shard_size))
+        pending: dict = {}
+
+        def submit_next() -> bool:
+            shard = next(shards, None)
+            if shard is None:
+                return False
+            future = self._executor.submit(_embed_shard, *shard)
+            pending[future] = shard[1]
+            return True
+
+        while len(pending) < 2 * self.workers and submit_next():
+            pass
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                shard = pending.pop(future)
+                _, vectors, chunk_rows = future.result()
+                submit_next()
+                yield shard, vectors, chunk_rows
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self) -> "EmbeddingPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
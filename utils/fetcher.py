@@ -0,0 +1,155 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, Iterator
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+logger = logging.getLogger(__name__)
+
+
+class HostLimiter:
+    """
+    Caps in-flight requests and spaces request starts for a single host.
+    """
+
+    def __init__(self, max_concurrency: int, requests_per_second: float | None):
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    def __enter__(self):
+        self._semaphore.acquire()
+        if self._interval:
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_start)
+                self._next_start = start + self._interval
+            if start > now:
+                time.sleep(start - now)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._semaphore.release()
+
+
+class Fetcher:
+    """
+    Concurrent HTTP GET engine for the scraper.
+
+    All requests share one pooled requests.Session, failed requests are retried with exponential
+    backoff, every host gets its own concurrency and rate limit, and raw responses can be cached
+    on disk by URL so unchanged pages are never downloaded twice.
+
+    Cached pages never expire, except the ones fetched with expiring=True (listings that gain links over time):
+    those are downloaded again once their copy is older than cache_ttl_seconds, or every time without a TTL.
+    """
+
+    def __init__(self, max_workers: int = 8, per_host_concurrency: int = 4, requests_per_second: float | None = 10.0,
+                 retries: int = 3, backoff_factor: float = 0.5, timeout: float = 30.0,
+                 cache_dir: str | Path | None = None, cache_ttl_seconds: float | None = None):
+        self.timeout = timeout
+        self.per_host_concurrency = per_host_concurrency
+        self.requests_per_second = requests_per_second
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.cache_hits = 0
+        self.downloads = 0
+
+        retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=("GET",), respect_retry_after_header=True)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_workers, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._limiters: dict[str, HostLimiter] = defaultdict(
+            lambda: HostLimiter(self.per_host_concurrency, self.requests_per_second))
+        self._limiters_lock = threading.Lock()
+        self._counters_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fetcher")
+
+    @classmethod
+    def from_config(cls, config: dict) -> "Fetcher":
+        ttl_hours = config.get("listing_cache_ttl_hours")
+        return cls(max_workers=config["max_workers"],
+                   per_host_concurrency=config["per_host_concurrency"],
+                   requests_per_second=config["requests_per_second"],
+                   retries=config["retries"],
+                   backoff_factor=config["backoff_factor"],
+                   timeout=config["timeout_seconds"],
+                   cache_dir=config.get("cache_dir"),
+                   cache_ttl_seconds=ttl_hours * 3600 if ttl_hours else None)
+
+    def _cache_path(self, url: str) -> Path:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.cache_dir / key[:2] / f"{key}.html"
+
+    def _read_cache(self, url: str, expiring: bool = False) -> bytes | None:
+        path = self._cache_path(url)
+        try:
+            if expiring and time.time() - path.stat().st_mtime > self.cache_ttl_seconds:
+                return None
+            return path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def _write_cache(self, url: str, content: bytes) -> None:
+        path = self._cache_path(url)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(content)
+        os.replace(tmp_path, path)
+
+    def _limiter(self, url: str) -> HostLimiter:
+        with self._limiters_lock:
+            return self._limiters[urlsplit(url).netloc]
+
+    def get(self, url: str, use_cache: bool = True, expiring: bool = False) -> bytes:
+        """
+        Returns the raw body of the page at url, from the disk cache when possible.
+        """
+        use_cache = use_cache and self.cache_dir is not None and (not expiring or bool(self.cache_ttl_seconds))
+        if use_cache:
+            content = self._read_cache(url, expiring)
+            if content is not None:
+                with self._counters_lock:
+                    self.cache_hits += 1
+                return content
+
+        with self._limiter(url):
+            response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        with self._counters_lock:
+            self.downloads += 1
+
+        if use_cache:
+            self._write_cache(url, response.content)
+        return response.content
+
+    def map(self, urls: Iterable[str], use_cache: bool = True, expiring: bool = False) -> Iterator[bytes]:
+        """
+        Fetches urls concurrently and yields their bodies in the input order.
+        """
+        return self._executor.map(lambda url: self.get(url, use_cache=use_cache, expiring=expiring), urls)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self.session.close()
+        logger.info("Fetcher closed: '%s' pages downloaded, '%s' served from cache", self.downloads, self.cache_hits)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
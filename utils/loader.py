@@ -1,54 +1,323 @@
+import hashlib
+import itertools
 import logging
+import time
+from contextlib import nullcontext
+from typing import Iterable, Iterator
 
+import more_itertools
+import numpy as np
 from opensearchpy import OpenSearch
+from sqlalchemy import bindparam, delete, func, text, update
+from sqlalchemy.dialects.postgresql import insert
 from database import SessionLocal
-from models import Post
+from models import Post, PostChunk
 
+import schemas
+
+from chunker import TokenChunker
 from embedder import Embedder
-from elastic_loader import create_index, update_search
+from embedding_pool import EmbeddingPool
+from elastic_loader import create_hybrid_pipeline, create_index, fast_indexing, get_indexed_ids, update_search
+from vector_index import ensure_vector_indexes
+from vector_store import publish_snapshot
 
 logger = logging.getLogger(__name__)
 
+# Fields that may change on fapl.ru without the article text changing
+MUTABLE_FIELDS = ("title", "dt", "tags", "n_visits", "author")
+
+
+def ensure_post_columns(db) -> None:
+    """
+    Adds the content_hash and updated_at columns to posts tables created before they existed.
+    """
+    db.execute(text("ALTER TABLE posts ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)"))
+    db.execute(text("ALTER TABLE posts ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT now()"))
+    db.execute(text("CREATE INDEX IF NOT EXISTS ix_posts_updated_at ON posts (updated_at)"))
+    db.commit()
+
+
+def compute_content_hash(text_content: str, embedder: Embedder, chunker: TokenChunker | None = None) -> str:
+    """
+    Hashes exactly what the embedder sees, so a prefix, model or chunking change also triggers re-embedding.
+    """
+    embedded_text = embedder.preprocess_sentences([text_content], doc_type="document")[0]
+    chunking = f"{chunker.chunk_size}/{chunker.overlap}" if chunker is not None else "-"
+    return hashlib.sha256(f"{embedder.model_name}\n{chunking}\n{embedded_text}".encode("utf-8")).hexdigest()
+
+
+def upsert_rows(db, rows: list[dict], fields: Iterable[str]) -> None:
+    table = Post.__table__
+    statement = insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.uid],
+        set_={**{field: statement.excluded[field] for field in fields}, "updated_at": func.now()},
+    )
+    db.execute(statement, rows)
+
 
-def load_and_process_text_documents(db, posts: list[Post], embedder: Embedder, os_client: OpenSearch) -> None:
+def split_posts_by_state(db, posts: list[Post], embedder: Embedder,
+                         chunker: TokenChunker | None = None) -> tuple[list[Post], list[Post]]:
     """
-    Loads and processes text documents from a file, chunking and vectorizing the content.
+    Splits posts into ones that need (re-)embedding and ones whose metadata only has to be updated.
+    Posts identical to the stored rows are dropped.
+    """
+    posts = list({post.uid: post for post in posts}.values())
+    stored = {
+        row.uid: row for row in
+        db.query(Post.uid, Post.content_hash, *[getattr(Post, field) for field in MUTABLE_FIELDS])
+        .filter(Post.uid.in_([post.uid for post in posts]))
+    }
+
+    to_embed, to_update = [], []
+    for post in posts:
+        row = stored.get(post.uid)
+        if row is None or row.content_hash != compute_content_hash(post.text_content, embedder, chunker):
+            to_embed.append(post)
+        elif (row.title, row.dt, tuple(row.tags or ()), row.n_visits, row.author) != \
+                (post.title, post.dt.date(), tuple(post.tags), post.n_visits, post.author):
+            to_update.append(post)
+
+    return to_embed, to_update
+
+
+def embed_posts(posts: list[Post], embedder: Embedder,
+                chunker: TokenChunker | None = None) -> tuple[np.ndarray, list[dict]]:
+    """
+    Returns one vector per post and, when a chunker is given, the rows for the post_chunks table.
+    With chunking the post vector is the normalized mean of its chunk vectors, so it covers the whole article.
+    """
+    if chunker is None:
+        return embedder.encode([post.text_content for post in posts], doc_type="document"), []
+
+    texts = [chunker.split(post.text_content) for post in posts]
+    chunk_vectors = embedder.encode([chunk for chunks in texts for chunk in chunks], doc_type="document")
+
+    post_vectors = np.empty((len(posts), chunk_vectors.shape[1]), dtype=np.float32)
+    chunk_rows = []
+    offset = 0
+    for i, (post, chunks) in enumerate(zip(posts, texts)):
+        vectors = chunk_vectors[offset:offset + len(chunks)]
+        offset += len(chunks)
+
+        mean = vectors.mean(axis=0)
+        post_vectors[i] = mean / np.linalg.norm(mean)
+        chunk_rows.extend({"post_uid": post.uid, "chunk_index": index, "text_content": chunk, "vector": vector.tolist()}
+                          for index, (chunk, vector) in enumerate(zip(chunks, vectors)))
+
+    return post_vectors, chunk_rows
+
+
+def encode_batches(posts: Iterable[Post], embedder: Embedder, chunk_size: int = 512,
+                   chunker: TokenChunker | None = None) -> Iterator[tuple[list[Post], np.ndarray, list[dict]]]:
+    for batch in more_itertools.chunked(posts, chunk_size):
+        yield batch, *embed_posts(batch, embedder, chunker)
+
+
+def store_vectors(db, posts: Iterable[Post], embedder: Embedder, chunk_size: int = 512,
+                  chunker: TokenChunker | None = None, keep_vectors: bool = False,
+                  pool: EmbeddingPool | None = None, content_hashes: bool = True) -> int:
+    """
+    Encodes posts batch by batch and upserts every batch into the posts table in one transaction.
+    With a chunker the posts' chunks replace their previous rows in post_chunks within the same transaction.
+    With keep_vectors the vectors are also set on the posts, so they can be indexed in OpenSearch.
+    With a pool the batches are the pool's shards, stored in the order they finish encoding.
+    Without content_hashes the rows are stored with an empty content_hash, see store_content_hashes.
+    """
+    total_posts = total_chunks = 0
+    encoding_time = writing_time = 0.0
+    batches = pool.map_shards(posts) if pool is not None else encode_batches(posts, embedder, chunk_size, chunker)
+
+    while True:
+        # With a pool this is the time spent waiting for the next finished shard
+        start = time.perf_counter()
+        encoded_batch = next(batches, None)
+        if encoded_batch is None:
+            break
+        batch, vectors, chunk_rows = encoded_batch
+        encoded = time.perf_counter()
+
+        rows = [{**post.model_dump(exclude={"vector"}),
+                 "vector": vector.tolist(),
+                 "content_hash": compute_content_hash(post.text_content, embedder, chunker) if content_hashes else None}
+                for post, vector in zip(batch, vectors)]
+        upsert_rows(db, rows, fields=[column.name for column in Post.__table__.columns
+                                      if column.name not in ("uid", "updated_at")])
+        if keep_vectors:
+            for post, row in zip(batch, rows):
+                post.vector = row["vector"]
+        db.execute(delete(PostChunk.__table__).where(PostChunk.post_uid.in_([post.uid for post in batch])))
+        if chunk_rows:
+            db.execute(insert(PostChunk.__table__), chunk_rows)
+        db.commit()
+        written = time.perf_counter()
+
+        total_posts += len(batch)
+        total_chunks += len(chunk_rows)
+        encoding_time += encoded - start
+        writing_time += written - encoded
+        logger.info("Stored batch of '%s' posts: %.1f posts/sec", len(batch), len(batch) / (written - start))
+
+    total_time = encoding_time + writing_time
+    logger.info("Stored '%s' posts ('%s' chunks) in %.1fs (%.1f posts/sec; encoding %.1fs, writing %.1fs)",
+                total_posts, total_chunks, total_time, total_posts / total_time if total_time else 0.0,
+                encoding_time, writing_time)
+    return total_posts
+
+
+def update_metadata(db, posts: list[Post]) -> None:
+    """
+    Updates mutable fields of already embedded posts, leaving their vectors untouched.
+    """
+    if not posts:
+        return
+    upsert_rows(db, [post.model_dump(exclude={"vector"}) for post in posts], fields=MUTABLE_FIELDS)
+    db.commit()
+
+
+def store_content_hashes(db, posts: list[Post], embedder: Embedder, chunker: TokenChunker | None = None) -> None:
+    """
+    Marks embedded posts as synced once they are indexed. Until then their content_hash is empty,
+    so posts a failed run did not get into OpenSearch are embedded and indexed again by the next one.
+    """
+    if not posts:
+        return
+    table = Post.__table__
+    db.execute(update(table).where(table.c.uid == bindparam("post_uid"))
+               .values(content_hash=bindparam("post_content_hash")),
+               [{"post_uid": post.uid, "post_content_hash": compute_content_hash(post.text_content, embedder, chunker)}
+                for post in posts])
+    db.commit()
+
+
+def iter_stored_posts(db, uids: Iterable[int], with_vectors: bool = False,
+                      chunk_size: int = 1000) -> Iterator[schemas.Post]:
+    """
+    Reads stored posts back for indexing, with their stored vectors for a knn index.
+    """
+    columns = [Post.uid, Post.title, Post.text_content, Post.tags, Post.n_visits, Post.author, Post.dt]
+    if with_vectors:
+        columns.append(Post.vector)
+    for batch in more_itertools.chunked(uids, chunk_size):
+        for row in db.query(*columns).filter(Post.uid.in_(batch)):
+            post = row._asdict()
+            if post.get("vector") is not None:
+                post["vector"] = post["vector"].tolist()
+            yield schemas.Post(**{**post, "tags": list(post["tags"] or ())})
+
+
+def bulk_options(bulk_config: dict | None) -> dict:
+    if bulk_config is None:
+        return {}
+    return {
+        "batch_size": bulk_config["chunk_size"],
+        "thread_count": bulk_config["thread_count"],
+        "max_chunk_bytes": bulk_config["max_chunk_bytes"],
+        "max_retries": bulk_config["max_retries"],
+        "initial_backoff": bulk_config["initial_backoff_seconds"],
+    }
+
+
+def load_and_process_text_documents(db, posts: list[Post], embedder: Embedder, os_client: OpenSearch,
+                                    chunk_size: int = 512, chunker: TokenChunker | None = None,
+                                    knn_config: dict | None = None, pool: EmbeddingPool | None = None,
+                                    index_name: str = "posts", bulk_config: dict | None = None) -> None:
+    """
+    Syncs the given posts into the vector DB and OpenSearch, embedding only new or changed texts.
+    With knn_config the OpenSearch documents also carry the post vectors for hybrid search.
+    Every run also reconciles the index with Postgres: stored posts missing from it (a recreated index,
+    a reset volume, a lost write, or on a knn index a document without a vector) are indexed again
+    from their stored rows and vectors.
+    Loads of at least bulk_config.fast_mode_min_docs posts index them with refreshes and replicas paused.
+
+    Content hashes and metadata changes are committed only after OpenSearch took the posts,
+    so a failed or retried run sees the same posts as changed again.
     """
 
     try:
-        create_index(index_name="posts", os_client=os_client)
-        update_search(posts=posts, os_client=os_client)
+        to_embed, to_update = split_posts_by_state(db, posts, embedder, chunker)
+        logger.info("Got '%s' new or changed posts to embed and '%s' posts with updated metadata "
+                    "('%s' unchanged)", len(to_embed), len(to_update), len(posts) - len(to_embed) - len(to_update))
+
+        n_posts = store_vectors(db, to_embed, embedder, chunk_size, chunker, keep_vectors=knn_config is not None,
+                                pool=pool, content_hashes=False)
+        logger.info("Processed and stored '%s' posts in vector DB", n_posts)
 
+        created = create_index(index_name=index_name, os_client=os_client, knn_config=knn_config,
+                               dimension=embedder.dimension)
+        indexed = set() if created else get_indexed_ids(index_name, os_client,
+                                                         with_field="vector" if knn_config is not None else None)
+        embedded = {post.uid for post in to_embed}
+        backfill = [uid for (uid,) in db.query(Post.uid).order_by(Post.uid)
+                    if uid not in embedded and uid not in indexed]
+        if backfill:
+            logger.info("Re-indexing '%s' stored posts missing from index %s", len(backfill), index_name)
+        to_index = itertools.chain(to_embed, iter_stored_posts(db, backfill, with_vectors=knn_config is not None))
+
+        fast_mode = bulk_config is not None and len(to_embed) + len(backfill) >= bulk_config["fast_mode_min_docs"]
+        with fast_indexing(index_name, os_client, bulk_config["max_num_segments"],
+                           bulk_config["forcemerge_timeout_seconds"]) if fast_mode else nullcontext():
+            update_search(posts=to_index, os_client=os_client, index_name=index_name, **bulk_options(bulk_config))
+        # Metadata-only updates must not wipe the vectors already indexed for these posts
+        update_search(posts=to_update, os_client=os_client, index_name=index_name, partial=True,
+                      **bulk_options(bulk_config))
         logger.info("Successfully created opensearch index and stored data")
 
-        for post in posts:
-            post.vector = embedder.encode([post.text_content], doc_type="document")[0].tolist()
-            doc = Post(**post.model_dump())
-            db.add(doc)
-            db.commit()
-        logger.info("Processed and stored '%s' posts in vector DB", len(posts))
+        update_metadata(db, to_update)
+        store_content_hashes(db, to_embed, embedder, chunker)
+        logger.info("Updated '%s' posts in vector DB, marked '%s' as synced", len(to_update), len(to_embed))
     except Exception as e:
         logger.error("Error processing text documents: '%s'", e)
         raise
 
 
+def export_vector_snapshot(db, config: dict, dimension: int) -> None:
+    """
+    Publishes the stored vectors for the in-process memory index of the API (retrieval.vector_backend: memory).
+    With chunking the snapshot holds chunk vectors keyed by chunk id, otherwise post vectors keyed by uid.
+    """
+    if config["chunking"]["enabled"]:
+        table, key, vector = PostChunk.__tablename__, PostChunk.id, PostChunk.vector
+    else:
+        table, key, vector = Post.__tablename__, Post.uid, Post.vector
+
+    start = time.perf_counter()
+    count = db.query(func.count(key)).filter(vector.isnot(None)).scalar()
+    rows = db.query(key, vector).filter(vector.isnot(None)).yield_per(2048)
+    publish_snapshot(config["retrieval"]["memory_index"]["snapshot_dir"], table, rows, count, dimension)
+    logger.info("Exported '%s' vectors from %s in %.1fs", count, table, time.perf_counter() - start)
+
+
 def load_data(posts: list[Post], embedder: Embedder, os_client: OpenSearch, config: dict) -> None:
     """
     Loads and processes data into the database by vectorizing text.
-    Only loads data into a table if the table is empty.
+    Posts are upserted by uid, so repeated runs only pick up what is new or changed.
     """
+    chunker = None
+    if config["chunking"]["enabled"]:
+        chunker = TokenChunker(embedder.tokenizer, config["chunking"]["chunk_size"], config["chunking"]["overlap"])
+
+    knn_config = config["os_params"]["knn"] if config["os_params"]["knn"]["enabled"] else None
+
+    # Workers are only spawned once there is something to encode
+    pool = EmbeddingPool.from_config(config) if config["data"]["embedding_workers"] > 1 else None
+
     db = SessionLocal()
     try:
-        # Check if there is any data in the Post table
-        if db.query(Post).first() is not None:
-            logger.info(
-                "Data already exists in the Post table. Skipping data loading for this table."
-            )
-        else:
-            logger.info(
-                "No existing data found in Post data. Proceeding with data loading and processing for this table."
-            )
-            load_and_process_text_documents(db, posts, embedder, os_client)
+        ensure_post_columns(db)
+        load_and_process_text_documents(db, posts, embedder, os_client,
+                                        chunk_size=config["data"]["ingest_chunk_size"], chunker=chunker,
+                                        knn_config=knn_config, pool=pool,
+                                        index_name=config["os_params"]["index_name"],
+                                        bulk_config=config["os_params"]["bulk"])
+        if knn_config is not None:
+            hybrid_config = config["retrieval"]["hybrid"]
+            create_hybrid_pipeline(config["os_params"]["hybrid_pipeline"], os_client,
+                                   hybrid_config["bm25_weight"], hybrid_config["knn_weight"])
+        ensure_vector_indexes(db, config["vector_index"])
+        if config["retrieval"]["vector_backend"] == "memory":
+            export_vector_snapshot(db, config, embedder.dimension)
 
         logger.info("Data loading process completed successfully.")
     except Exception as e:
@@ -57,3 +326,5 @@ def load_data(posts: list[Post], embedder: Embedder, os_client: OpenSearch, conf
         raise
     finally:
         db.close()
+        if pool is not None:
+            pool.close()
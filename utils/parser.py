@@ -1,12 +1,14 @@
 import re
-import requests
 import logging
+from typing import Callable, NamedTuple
 
-from bs4 import BeautifulSoup
+import lxml.html
+from bs4 import BeautifulSoup, SoupStrainer
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
 
 from config import BASE_URL
+from fetcher import Fetcher
 from schemas import Post
 
 
@@ -25,27 +27,19 @@ def get_months_to_iterate(n_months_to_iterate: int) -> list[str]:
     return months
 
 
-def get_soup_from_url(url: str) -> BeautifulSoup:
-    response = requests.get(url)
-    html = response.content.decode('windows-1251', errors='replace')
+def decode_html(content: bytes) -> str:
+    return content.decode('windows-1251', errors='replace')
 
-    return BeautifulSoup(html, 'html.parser')
 
+TIMESTAMP_PATTERN = re.compile(r"^\d{2}\.\d{2}\.\d{4}")
 
-def get_daily_posts_links(month: str) -> list[str]:
-    url = BASE_URL + '/calendar/' + month
-
-    response = requests.get(url)
-    html = response.content.decode('windows-1251', errors='replace')
-
-    soup = BeautifulSoup(html, 'html.parser')
 
+def process_daily_posts_links(soup: BeautifulSoup, base_url: str = BASE_URL) -> list[str]:
     paragraphs = soup.findAll('p')
-    timestamp_pattern = re.compile(r"^\d{2}\.\d{2}\.\d{4}")
 
     daily_posts_links = [
-        BASE_URL + p.find('a')['href'] for p in paragraphs
-        if timestamp_pattern.match(p.text.split()[0].strip())
+        base_url + p.find('a')['href'] for p in paragraphs
+        if TIMESTAMP_PATTERN.match(p.text.split()[0].strip())
         and p.find('a', href=True)
     ]
 
@@ -73,21 +67,99 @@ def process_post(soup: BeautifulSoup, uid: int) -> Post:
                 vector=None)
 
 
-def get_posts(n_months_to_iterate: int) -> list[dict]:
+def has_class(class_name: str) -> str:
+    return f'contains(concat(" ", normalize-space(@class), " "), " {class_name} ")'
+
+
+def lxml_process_daily_posts_links(tree: lxml.html.HtmlElement, base_url: str = BASE_URL) -> list[str]:
+    daily_posts_links = []
+    for p in tree.iter('p'):
+        if TIMESTAMP_PATTERN.match(p.text_content().split()[0].strip()) and p.xpath('.//a[@href]'):
+            daily_posts_links.append(base_url + p.xpath('.//a')[0].get('href'))
+
+    return daily_posts_links
+
+
+def lxml_process_post(tree: lxml.html.HtmlElement, uid: int) -> Post:
+    block = tree.xpath(f'//div[{has_class("block")}]')[0]
+
+    def text(xpath: str) -> str:
+        return block.xpath(xpath)[0].text_content()
+
+    title = text('.//h2')
+    content = block.xpath(f'.//div[{has_class("content")}]')[0]
+    text_content = ' '.join([elem.text_content().strip() for elem in content.iter('p')])
+    tags = [elem.text_content() for elem in block.xpath(f'.//p[{has_class("tags")}]')[0].iter('a')]
+
+    n_visits = int(re.findall(r'\d+', text(f'.//p[{has_class("visits")}]'))[0])
+    author = text(f'.//p[{has_class("author")}]').strip()
+    dt = datetime.strptime(text(f'.//p[{has_class("date")}]').strip(), '%d.%m.%Y %H:%M')
+
+    return Post(uid=uid,
+                title=title,
+                text_content=text_content,
+                tags=tags,
+                n_visits=n_visits,
+                author=author,
+                dt=dt,
+                vector=None)
+
+
+class ParserBackend(NamedTuple):
+    parse_daily_posts_links: Callable[[str, str], list[str]]
+    parse_post: Callable[[str, int], Post]
+
+
+PARSER_BACKENDS: dict[str, ParserBackend] = {
+    # Reference implementation: full pure-Python tree of the page
+    "html.parser": ParserBackend(
+        parse_daily_posts_links=lambda html, base_url: process_daily_posts_links(
+            BeautifulSoup(html, 'html.parser'), base_url),
+        parse_post=lambda html, uid: process_post(BeautifulSoup(html, 'html.parser'), uid),
+    ),
+    # Same parser, but only the paragraphs / the div.block subtrees are built
+    "strainer": ParserBackend(
+        parse_daily_posts_links=lambda html, base_url: process_daily_posts_links(
+            BeautifulSoup(html, 'html.parser', parse_only=SoupStrainer('p')), base_url),
+        parse_post=lambda html, uid: process_post(
+            BeautifulSoup(html, 'html.parser', parse_only=SoupStrainer('div', class_='block')), uid),
+    ),
+    # libxml2 tree and XPath lookups
+    "lxml": ParserBackend(
+        parse_daily_posts_links=lambda html, base_url: lxml_process_daily_posts_links(
+            lxml.html.fromstring(html), base_url),
+        parse_post=lambda html, uid: lxml_process_post(lxml.html.fromstring(html), uid),
+    ),
+}
+
+
+def parse_daily_posts_links(html: str, base_url: str = BASE_URL, backend: str = "html.parser") -> list[str]:
+    return PARSER_BACKENDS[backend].parse_daily_posts_links(html, base_url)
+
+
+def parse_post(html: str, uid: int, backend: str = "html.parser") -> Post:
+    return PARSER_BACKENDS[backend].parse_post(html, uid)
+
+
+def get_posts(n_months_to_iterate: int, fetcher: Fetcher, base_url: str = BASE_URL,
+              backend: str = "html.parser") -> list[dict]:
     months = get_months_to_iterate(n_months_to_iterate)
     posts = []
 
-    for month in months:
-        daily_posts_links = get_daily_posts_links(month)
+    monthly_links = fetcher.map([base_url + '/calendar/' + month for month in months], expiring=True)
+    post_urls = []
+    for month, html in zip(months, monthly_links):
+        daily_posts_links = parse_daily_posts_links(decode_html(html), base_url, backend)
 
         logger.info("For month '%s' got '%s' daily posts", month, len(daily_posts_links))
-        for post_url in daily_posts_links:
-            uid = int(re.findall(r'\d+', post_url)[0])
-            soup = get_soup_from_url(url=post_url)
+        post_urls.extend(daily_posts_links)
+
+    for post_url, html in zip(post_urls, fetcher.map(post_urls)):
+        uid = int(re.findall(r'\d+', post_url.removeprefix(base_url))[0])
 
-            post = process_post(soup, uid)
-            posts.append(post.model_dump())
+        post = parse_post(decode_html(html), uid, backend)
+        posts.append(post.model_dump())
 
     logger.info("Loaded '%s' posts", len(posts))
 
-    return posts
\ No newline at end of file
+    return posts
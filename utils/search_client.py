@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from opensearchpy import AsyncOpenSearch, OpenSearch
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONNECTION_CONFIG = {"pool_maxsize": 10, "timeout_seconds": 10, "max_retries": 3, "retry_on_timeout": False,
+                             "warm_up_connections": 0}
+
+
+def connection_config(os_config: dict) -> dict:
+    return {**DEFAULT_CONNECTION_CONFIG, **os_config.get("connection", {})}
+
+
+def client_options(os_config: dict) -> dict:
+    connection = connection_config(os_config)
+    return {
+        "hosts": [{"host": os_config["host"], "port": os_config["port"]}],
+        "timeout": connection["timeout_seconds"],
+        "max_retries": connection["max_retries"],
+        "retry_on_timeout": connection["retry_on_timeout"],
+    }
+
+
+def create_os_client(os_config: dict) -> OpenSearch:
+    """
+    Sync client over a urllib3 pool of os_params.connection.pool_maxsize connections per node.
+    """
+    return OpenSearch(pool_maxsize=connection_config(os_config)["pool_maxsize"], **client_options(os_config))
+
+
+def create_async_os_client(os_config: dict) -> AsyncOpenSearch:
+    """
+    Async client over an aiohttp pool of the same size, for the async request paths.
+    """
+    return AsyncOpenSearch(maxsize=connection_config(os_config)["pool_maxsize"], **client_options(os_config))
+
+
+def os_pool_stats(os_client: OpenSearch | AsyncOpenSearch) -> list[dict]:
+    stats = []
+    for connection in os_client.transport.connection_pool.connections:
+        if isinstance(os_client, AsyncOpenSearch):
+            connector = connection.session.connector
+            in_use = len(connector._acquired)
+            stats.append({"host": connection.host, "maxsize": connector.limit, "in_use": in_use,
+                          "utilization": in_use / connector.limit if connector.limit else 0.0})
+        else:
+            pool = connection.pool
+            stats.append({"host": connection.host, "maxsize": pool.pool.maxsize,
+                          "connections_created": pool.num_connections, "requests": pool.num_requests})
+    return stats
+
+
+def warm_up_os_client(os_client: OpenSearch, n_connections: int) -> bool:
+    """
+    Sends n_connections concurrent pings so that many connections are open before the first query.
+    Returns False (and only logs) when the cluster is unreachable, the API can still start without it.
+    """
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max(n_connections, 1)) as pool:
+        reachable = all(pool.map(lambda _: os_client.ping(), range(n_connections)))
+    log_warm_up("OpenSearch", reachable, n_connections, time.perf_counter() - start)
+    return reachable
+
+
+async def warm_up_async_os_client(os_client: AsyncOpenSearch, n_connections: int) -> bool:
+    start = time.perf_counter()
+    reachable = all(await asyncio.gather(*(os_client.ping() for _ in range(n_connections))))
+    log_warm_up("async OpenSearch", reachable, n_connections, time.perf_counter() - start)
+    return reachable
+
+
+def log_warm_up(name: str, reachable: bool, n_connections: int, elapsed: float) -> None:
+    if reachable:
+        logger.info(f"Warmed up {n_connections} {name} connections in {elapsed:.2f}s")
+    else:
+        logger.warning(f"{name} is not reachable, skipped connection warm-up")
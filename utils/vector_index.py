@@ -0,0 +1,67 @@
+import logging
+
+from sqlalchemy import text
+
+
+logger = logging.getLogger(__name__)
+
+# Tables with a pgvector "vector" column that get a managed ANN index
+VECTOR_TABLES = ("posts", "post_chunks")
+INDEX_PREFIX = "vector_ann"
+
+
+def index_name(table: str, config: dict) -> str | None:
+    """
+    The index name encodes the build parameters, so a config change is detected by name alone.
+    """
+    method = config["method"]
+    if method == "hnsw":
+        return f"{table}_{INDEX_PREFIX}_hnsw_m{config['hnsw']['m']}_efc{config['hnsw']['ef_construction']}"
+    if method == "ivfflat":
+        return f"{table}_{INDEX_PREFIX}_ivfflat_l{config['ivfflat']['lists']}"
+    return None
+
+
+def index_ddl(table: str, config: dict) -> str:
+    method = config["method"]
+    if method == "hnsw":
+        params = f"m = {int(config['hnsw']['m'])}, ef_construction = {int(config['hnsw']['ef_construction'])}"
+    else:
+        params = f"lists = {int(config['ivfflat']['lists'])}"
+    return (f"CREATE INDEX IF NOT EXISTS {index_name(table, config)} "
+            f"ON {table} USING {method} (vector vector_cosine_ops) WITH ({params})")
+
+
+def ensure_vector_indexes(db, config: dict) -> None:
+    """
+    Makes every vector table carry exactly the ANN index described by the "vector_index" config:
+    stale managed indexes are dropped and the expected one is built if it is missing.
+    """
+    for table in VECTOR_TABLES:
+        expected = index_name(table, config)
+        existing = db.execute(
+            text("SELECT indexname FROM pg_indexes WHERE tablename = :table AND indexname LIKE :prefix"),
+            {"table": table, "prefix": f"{table}_{INDEX_PREFIX}_%"},
+        ).scalars().all()
+
+        for name in existing:
+            if name != expected:
+                db.execute(text(f"DROP INDEX IF EXISTS {name}"))
+                logger.info("Dropped stale vector index '%s'", name)
+
+        if expected is not None and expected not in existing:
+            db.execute(text(f"SET LOCAL maintenance_work_mem = '{config['maintenance_work_mem']}'"))
+            db.execute(text(index_ddl(table, config)))
+            logger.info("Built vector index '%s'", expected)
+        db.commit()
+
+
+def set_search_params(db, config: dict) -> None:
+    """
+    Sets the per-query ANN search breadth for the current transaction.
+    """
+    method = config["method"]
+    if method == "hnsw":
+        db.execute(text(f"SET LOCAL hnsw.ef_search = {int(config['hnsw']['ef_search'])}"))
+    elif method == "ivfflat":
+        db.execute(text(f"SET LOCAL ivfflat.probes = {int(config['ivfflat']['probes'])}"))